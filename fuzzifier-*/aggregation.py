@@ -0,0 +1,45 @@
+import numpy as np
+from membership import quantizedMean, quantizedArgmax
+from sparse import TopTwoMemberships
+
+DOWN = ["-INF", "--", "-"]
+UP = ["INF", "++", "+"]
+
+
+
+def clusterAggregates (values, clusterCodes, numClusters):
+    if isinstance (values, TopTwoMemberships):
+        return values.clusterMeans (clusterCodes, numClusters), values.mainFractions (clusterCodes, numClusters)
+    values = np.asarray (values); clusterCodes = np.asarray (clusterCodes, dtype = int); quantized = values.dtype == np.uint16
+    numFeatures, _, numSets = values.shape
+    counts = np.bincount (clusterCodes, minlength = numClusters); nonEmpty = counts > 0
+    order = np.argsort (clusterCodes, kind = "stable"); starts = np.cumsum (counts) - counts
+    means = np.full ((numFeatures, numClusters, numSets), np.nan); ordered = values[:, order]
+    for idx in np.where (nonEmpty)[0]:
+        block = ordered[:, starts[idx]:(starts[idx] + counts[idx])]
+        means[:, idx] = quantizedMean (block, axis = 1) if quantized else block.sum (axis = 1) / counts[idx]
+    mainSets = quantizedArgmax (values, axis = 2) if quantized else values.argmax (axis = 2)
+    key = (np.arange (numFeatures)[:, None] * numClusters + clusterCodes[None, :]) * numSets + mainSets
+    mainCounts = np.bincount (key.ravel (), minlength = numFeatures * numClusters * numSets).reshape (numFeatures, numClusters, numSets)
+    with np.errstate (invalid = "ignore", divide = "ignore"):
+        return means, mainCounts / counts[None, :, None]
+
+
+
+def regulationSums (avgFV, pctMainFS, allSets):
+    sums = dict ()
+    for regulation, sets in [("--", DOWN), ("++", UP)]:
+        idx = [allSets.index (nameFS) for nameFS in sets]
+        sums[regulation] = (avgFV[:, :, idx[0]] + avgFV[:, :, idx[1]] + avgFV[:, :, idx[2]],
+                            pctMainFS[:, :, idx[0]] + pctMainFS[:, :, idx[1]] + pctMainFS[:, :, idx[2]])
+    return sums
+
+
+
+def regulationCalls (sums, avgFV_cutoff, pctMainFS_cutoff):
+    calls = np.full (sums["--"][0].shape, "", dtype = object)
+    for regulation, (avgSum, pctSum) in sums.items ():
+        calls[(avgSum > avgFV_cutoff) & (pctSum > pctMainFS_cutoff)] = regulation
+    return calls
+
+
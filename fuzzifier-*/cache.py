@@ -0,0 +1,101 @@
+import os
+import json
+import glob
+import shutil
+import hashlib
+import tempfile
+
+
+
+def hashFile (digest, path, blockSize = 2 ** 20):
+    with open (path, "rb") as f:
+        for block in iter (lambda: f.read (blockSize), b""):
+            digest.update (block)
+    return digest
+
+
+
+def codeVersion ():
+    digest = hashlib.sha256 ()
+    for path in sorted (glob.glob (os.path.join (os.path.dirname (os.path.abspath (__file__)), "*.py"))):
+        digest.update (os.path.basename (path).encode ()); hashFile (digest, path)
+    return digest.hexdigest ()
+
+
+
+def pathSize (path):
+    if os.path.isfile (path):
+        return os.path.getsize (path)
+    return sum ([os.path.getsize (os.path.join (root, name)) for root, _, names in os.walk (path) for name in names])
+
+
+
+class Cache:
+    def __init__ (self, directory, maxSize = 2048):
+        self.directory = directory; self.maxSize = maxSize * 2 ** 20
+        os.makedirs (self.directory, exist_ok = True)
+
+
+    def key (self, files, params):
+        digest = hashlib.sha256 ()
+        digest.update (codeVersion ().encode ())
+        digest.update (json.dumps (params, sort_keys = True, default = str).encode ())
+        for path in files:
+            digest.update (b"\0"); hashFile (digest, path)
+        return digest.hexdigest ()
+
+
+    def entry (self, key):
+        return os.path.join (self.directory, key)
+
+
+    def load (self, key, output, owned = list ()):
+        entry = self.entry (key)
+        if not os.path.isdir (entry):
+            return False
+        os.makedirs (output, exist_ok = True)
+        for path in [path for pattern in owned for path in glob.glob (os.path.join (glob.escape (output), pattern))]:
+            if os.path.isdir (path):
+                shutil.rmtree (path)
+            elif os.path.exists (path):
+                os.remove (path)
+        for name in os.listdir (entry):
+            if os.path.isdir (os.path.join (entry, name)):
+                if os.path.exists (os.path.join (output, name)):
+                    shutil.rmtree (os.path.join (output, name))
+                shutil.copytree (os.path.join (entry, name), os.path.join (output, name))
+            else:
+                shutil.copyfile (os.path.join (entry, name), os.path.join (output, name))
+        os.utime (entry)
+        return True
+
+
+    def save (self, key, output, names):
+        if sum ([pathSize (os.path.join (output, name)) for name in names]) > self.maxSize:
+            return False
+        tmp = tempfile.mkdtemp (dir = self.directory, prefix = ".tmp_")
+        for name in names:
+            if os.path.isdir (os.path.join (output, name)):
+                shutil.copytree (os.path.join (output, name), os.path.join (tmp, name))
+            else:
+                shutil.copyfile (os.path.join (output, name), os.path.join (tmp, name))
+        if os.path.exists (self.entry (key)):
+            shutil.rmtree (self.entry (key))
+        os.replace (tmp, self.entry (key))
+        self.evict (keep = key)
+        return True
+
+
+    def evict (self, keep = None):
+        entries = [name for name in os.listdir (self.directory) if not name.startswith (".")]
+        entries = sorted (entries, key = lambda name: os.path.getmtime (self.entry (name)), reverse = True)
+        total = 0
+        for name in entries:
+            size = pathSize (self.entry (name))
+            if name != keep and total + size > self.maxSize:
+                shutil.rmtree (self.entry (name))
+            else:
+                total += size
+
+
+
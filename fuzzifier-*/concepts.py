@@ -0,0 +1,187 @@
+import os
+import json
+import numpy as np
+from fuzzifier import stackConcepts
+
+
+
+class ConceptBank:
+    def __init__ (self, params, isGauss, clusters, features, defined = None):
+        self.params = np.ascontiguousarray (params, dtype = float)
+        self.isGauss = np.ascontiguousarray (isGauss, dtype = bool)
+        self.clusters = list (clusters); self.features = list (features)
+        if self.params.ndim != 4 or self.params.shape[3] != 4 or self.params.shape[:3] != self.isGauss.shape:
+            raise ValueError
+        if self.params.shape[:2] != (len (self.clusters), len (self.features)):
+            raise ValueError
+        if defined is None:
+            defined = np.ones (self.params.shape[:2], dtype = bool)
+        self.defined = np.asarray (defined, dtype = bool)
+        self.clusterIndex = {cluster: idx for idx, cluster in enumerate (self.clusters)}
+        self.featureIndex = {feature: idx for idx, feature in enumerate (self.features)}
+
+
+    @property
+    def numSets (self):
+        return self.params.shape[2]
+
+
+    @classmethod
+    def fromFeatures (cls, conceptDict, cluster = "ALL", features = None):
+        features = list (conceptDict.keys ()) if features is None else list (features)
+        if len (conceptDict) == 0:
+            return cls (np.zeros ((1, len (features), 0, 4)), np.zeros ((1, len (features), 0), dtype = bool), [cluster], features,
+                        defined = np.zeros ((1, len (features)), dtype = bool))
+        defined = np.array ([feature in conceptDict for feature in features], dtype = bool)
+        concepts, gauss = stackConcepts ([conceptDict[feature] for feature in np.array (features, dtype = object)[defined]])
+        params = np.full ((1, len (features)) + concepts.shape[1:], np.nan); isGauss = np.zeros ((1, len (features)) + gauss.shape[1:], dtype = bool)
+        params[0, defined] = concepts; isGauss[0, defined] = gauss; defined = defined[None, :]
+        return cls (params, isGauss, [cluster], features, defined = defined)
+
+
+    @classmethod
+    def fromArrays (cls, params, isGauss, features, cluster = "ALL", defined = None):
+        params = np.asarray (params, dtype = float); isGauss = np.broadcast_to (isGauss, params.shape[:2])
+        if defined is not None:
+            defined = np.asarray (defined, dtype = bool)[None, :]
+        return cls (params[None], isGauss[None], [cluster], features, defined = defined)
+
+
+    @classmethod
+    def fromDict (cls, fuzzyConcepts):
+        return cls.concat ([cls.fromFeatures (fuzzyConcepts[cluster], cluster = cluster) for cluster in fuzzyConcepts.keys ()])
+
+
+    @classmethod
+    def concat (cls, banks, clusters = None, features = None):
+        if features is None:
+            features = list (dict.fromkeys ([feature for bank in banks for feature in bank.features]))
+        features = list (features); featureIndex = {feature: idx for idx, feature in enumerate (features)}
+        numSets = max ([bank.numSets for bank in banks])
+        params = np.full ((sum ([len (bank.clusters) for bank in banks]), len (features), numSets, 4), np.nan)
+        isGauss = np.zeros (params.shape[:3], dtype = bool); defined = np.zeros (params.shape[:2], dtype = bool)
+        allClusters = list (); row = 0
+        for bank in banks:
+            if bank.defined.any () and bank.numSets != numSets:
+                raise ValueError
+            colIdx = np.array ([featureIndex[feature] for feature in bank.features], dtype = int)
+            rows = slice (row, row + len (bank.clusters))
+            if bank.numSets == numSets:
+                params[rows][:, colIdx] = bank.params; isGauss[rows][:, colIdx] = bank.isGauss
+            defined[rows][:, colIdx] = bank.defined
+            allClusters += bank.clusters; row += len (bank.clusters)
+        clusters = allClusters if clusters is None else list (clusters)
+        return cls (params, isGauss, clusters, features, defined = defined)
+
+
+    @classmethod
+    def join (cls, banks):
+        numSets = max ([bank.numSets for bank in banks]); clusters = banks[0].clusters
+        features = [feature for bank in banks for feature in bank.features]
+        params = np.full ((len (clusters), len (features), numSets, 4), np.nan)
+        isGauss = np.zeros (params.shape[:3], dtype = bool); defined = np.zeros (params.shape[:2], dtype = bool)
+        col = 0
+        for bank in banks:
+            if bank.clusters != clusters or (bank.defined.any () and bank.numSets != numSets):
+                raise ValueError
+            cols = slice (col, col + len (bank.features))
+            if bank.numSets == numSets:
+                params[:, cols] = bank.params; isGauss[:, cols] = bank.isGauss
+            defined[:, cols] = bank.defined; col += len (bank.features)
+        return cls (params, isGauss, clusters, features, defined = defined)
+
+
+    def has (self, cluster, feature):
+        return cluster in self.clusterIndex and feature in self.featureIndex and \
+               bool (self.defined[self.clusterIndex[cluster], self.featureIndex[feature]])
+
+
+    def get (self, cluster, feature):
+        c = self.clusterIndex[cluster]; f = self.featureIndex[feature]
+        if not self.defined[c, f]:
+            raise KeyError (feature)
+        return [p[:2].tolist () if gauss else p.tolist () for p, gauss in zip (self.params[c, f], self.isGauss[c, f])]
+
+
+    def tensor (self, cluster, features = None):
+        c = self.clusterIndex[cluster]
+        if features is None:
+            idx = slice (None)
+        else:
+            idx = np.array ([self.featureIndex[feature] for feature in features], dtype = int)
+            if not self.defined[c, idx].all ():
+                raise KeyError (cluster)
+        return self.params[c, idx], self.isGauss[c, idx]
+
+
+    def lookup (self, cluster, features):
+        params = np.full ((len (features), self.numSets, 4), np.nan)
+        isGauss = np.zeros (params.shape[:2], dtype = bool); defined = np.zeros (len (features), dtype = bool)
+        if cluster in self.clusterIndex:
+            c = self.clusterIndex[cluster]
+            idx = np.array ([self.featureIndex.get (feature, -1) for feature in features], dtype = int); found = idx >= 0
+            params[found] = self.params[c, idx[found]]; isGauss[found] = self.isGauss[c, idx[found]]
+            defined[found] = self.defined[c, idx[found]]
+        return params, isGauss, defined
+
+
+    def repeat (self, features):
+        if len (self.features) != 1:
+            raise ValueError
+        features = list (features)
+        return ConceptBank (np.repeat (self.params, len (features), axis = 1), np.repeat (self.isGauss, len (features), axis = 1),
+                            self.clusters, features, defined = np.repeat (self.defined, len (features), axis = 1))
+
+
+    def validate (self):
+        with np.errstate (invalid = "ignore"):
+            trap = ~self.isGauss
+            valid = ~np.isnan (self.params[..., :2]).any (axis = 3)
+            valid &= ~trap | ~np.isnan (self.params[..., 2:]).any (axis = 3)
+            sortedParams = np.diff (self.params, axis = 3) >= 0
+            sortedParams[..., 0, :2] = True; sortedParams[..., -1, 1:] = True
+            valid &= ~trap | sortedParams.all (axis = 3)
+            valid &= trap | (np.isfinite (self.params[..., 0]) & (self.params[..., 1] >= 0))
+        return valid.all (axis = 2) | ~self.defined
+
+
+    def toDict (self):
+        constRev = {-np.inf: "-Infinity", np.inf: "Infinity"}; fuzzyConcepts = dict ()
+        for c, cluster in enumerate (self.clusters):
+            fuzzyConcepts[cluster] = dict ()
+            for f in np.where (self.defined[c])[0]:
+                fuzzyConcepts[cluster][self.features[f]] = [[constRev.get (x, x) if not np.isnan (x) else "NaN" for x in t]
+                                                            for t in self.get (cluster, self.features[f])]
+        return fuzzyConcepts
+
+
+    def save (self, path):
+        if path.endswith (".json"):
+            with open (path, "w", encoding = "utf-8") as f:
+                json.dump (self.toDict (), f, ensure_ascii = False, indent = 4, allow_nan = True)
+        else:
+            setTypes = np.where (self.isGauss[self.defined].all (axis = 0), "gauss", np.where (self.isGauss[self.defined].any (axis = 0), "mixed", "trapezoidal"))
+            header = {"clusters": self.clusters, "features": self.features, "set_types": setTypes.tolist ()}
+            with open (path, "wb") as f:
+                np.savez (f, params = self.params, isGauss = self.isGauss, defined = self.defined,
+                          header = np.array (json.dumps (header, default = lambda x: x.item ())))
+
+
+    @classmethod
+    def load (cls, path):
+        if path.endswith (".json"):
+            with open (path) as f:
+                return cls.fromDict (json.load (f))
+        with np.load (path, allow_pickle = False) as data:
+            header = json.loads (data["header"].item ())
+            return cls (data["params"], data["isGauss"], header["clusters"], header["features"], defined = data["defined"])
+
+
+
+def conceptPath (directory, name):
+    for ext in [".npz", ".json"]:
+        if os.path.exists (os.path.join (directory, name + ext)):
+            return os.path.join (directory, name + ext)
+    raise FileNotFoundError (os.path.join (directory, name))
+
+
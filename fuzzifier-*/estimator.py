@@ -2,6 +2,35 @@ import warnings
 import numpy as np
 import pandas as pd
 from scipy import stats, signal
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concepts import ConceptBank
+
+
+def estimateBlock (task):
+    estimator, shmName, shape, rows, index, columns, kwargs = task
+    shm = shared_memory.SharedMemory (name = shmName)
+    try:
+        block = pd.DataFrame (np.ndarray (shape, dtype = float, buffer = shm.buf)[rows].copy (), index = index, columns = columns)
+    finally:
+        shm.close ()
+    return estimator (block, **kwargs)
+
+
+
+def estimateParallel (estimator, matrix, n_jobs, **kwargs):
+    shm = shared_memory.SharedMemory (create = True, size = max (1, matrix.size * np.dtype (float).itemsize))
+    try:
+        np.ndarray (matrix.shape, dtype = float, buffer = shm.buf)[:] = matrix.to_numpy (dtype = float)
+        blocks = np.array_split (np.arange (matrix.shape[0]), min (matrix.shape[0], 4 * n_jobs))
+        tasks = [(estimator, shm.name, matrix.shape, slice (block[0], block[-1] + 1), matrix.index[block], matrix.columns, kwargs)
+                 for block in blocks]
+        with ProcessPoolExecutor (max_workers = n_jobs) as executor:
+            banks = list (executor.map (estimateBlock, tasks))
+    finally:
+        shm.close (); shm.unlink ()
+    return ConceptBank.join (banks)
+
 
 
 def fixOverlapCutoff (cutoff):
@@ -71,39 +100,76 @@ def getFullConcept (partial, functionType, valueRange):
 
 
 
-def estimateTrapezoidalConcept (ticks, numFuzzySets, percents = list (), slope = list ()):
+def getTickPositions (numFuzzySets, functionType, percents = list (), slope = list ()):
     if len (percents) != numFuzzySets:
         if len (percents) > 0:
             warnings.warn ("Unequal number of proportions and fuzzy sets, returning to default (equal) mode.")
         percents = [1 / numFuzzySets] * numFuzzySets
     cutoff = estimateCutoff (pd.DataFrame ({"percents": range (1001)}).T, [i for i in percents]).loc["percents"]
-    if len (slope) != numFuzzySets - 1:
-        if len (slope) > 0:
-            warnings.warn ("Unequal number of slopes and cutoffs, returning to default (equal) mode.")
-        slope = [cutoff.diff ().iloc[1:].min () / 4] * (numFuzzySets - 1)
-    partial = np.round ([cutoff.tolist ()[1:-1], [round (1000 * i) for i in slope]]).T
-    concept = getFullConcept (partial, "trap", [0, 1000])
-    concept = {feature: np.array ([[ticks.loc[feature, int (i)] for i in params] for params in concept])
-               for feature in ticks.index}
-    return concept
+    match functionType:
+        case "trapezoidal":
+            if len (slope) != numFuzzySets - 1:
+                if len (slope) > 0:
+                    warnings.warn ("Unequal number of slopes and cutoffs, returning to default (equal) mode.")
+                slope = [cutoff.diff ().iloc[1:].min () / 4] * (numFuzzySets - 1)
+            partial = np.round ([cutoff.tolist ()[1:-1], [round (1000 * i) for i in slope]]).T
+            positions = getFullConcept (partial, "trap", [0, 1000]).astype (int)
+        case "gauss":
+            positions = np.array ([0] + [int (C) for C in cutoff.iloc[1:-1]] + [1000])
+        case _:
+            raise ValueError
+    if (positions < 0).any () or (positions > 1000).any ():
+        raise ValueError
+    return positions
 
 
 
-def estimateGaussianConcept (ticks, numFuzzySets, percents = list ()):
-    if len (percents) != numFuzzySets:
-        if len (percents) > 0:
-            warnings.warn ("Unequal number of proportions and fuzzy sets, returning to default (equal) mode.")
-        percents = [1 / numFuzzySets] * numFuzzySets
-    cutoff = estimateCutoff (pd.DataFrame ({"percents": range (1001)}).T, percents).loc["percents"]
-    concept = {feature: getFullConcept (np.array (ticks.loc[feature], [int (10 * C) for C in cutoff]), "gauss",
-                                        [ticks.loc[feature, 0], ticks.loc[feature, 1000]])
-               for feature in ticks.index}
-    return concept
+def roundTicks (ticks, positions):
+    ticks = ticks.round (3); ticks[:, positions == 0] = np.floor (ticks[:, positions == 0]) - 1
+    return ticks
+
+
+
+def getTicks (matrix, positions, cutoffBy = "proportion", valueRange = None):
+    values = matrix.to_numpy (dtype = float)
+    with warnings.catch_warnings ():
+        warnings.simplefilter ("ignore", category = RuntimeWarning)
+        match cutoffBy:
+            case "proportion":
+                ticks = roundTicks (np.nanquantile (values, np.linspace (0, 1, 1001)[positions], axis = 1).T, positions)
+            case "width":
+                minimum = np.floor (np.nanmin (values, axis = 1)) - 1; minimum[np.isnan (minimum)] = valueRange[0]
+                maximum = np.ceil (np.nanmax (values, axis = 1)) + 1; maximum[np.isnan (maximum)] = valueRange[1]
+                ticks = minimum[:, None] + positions * ((maximum - minimum) / 1000)[:, None]
+                ticks[:, positions == 1000] = maximum[:, None]; ticks = ticks.round (3)
+            case _:
+                raise ValueError
+    return ticks
+
+
+
+def estimateGaussianConcept (cutoff):
+    center = cutoff[:, 1:] - np.diff (cutoff, axis = 1) / 2
+    bounds = np.column_stack ([cutoff[:, 0], center, cutoff[:, -1]]); gaps = np.diff (bounds, axis = 1)
+    fct1 = np.sqrt (2 * np.log (2)); fct2 = np.sqrt (6 * np.log (10))
+    sigma = np.minimum (gaps[:, 1:], gaps[:, :-1]) / fct1
+    if center.shape[1] > 2:
+        sigma[:, :-1] = np.minimum (sigma[:, :-1], (bounds[:, 3:] - bounds[:, 1:-2]) / fct2)
+        sigma[:, 2:] = np.minimum (sigma[:, 2:], (bounds[:, 3:-1] - bounds[:, 1:-3]) / fct2)
+    return np.round (np.stack ([center, np.round (sigma, 3)], axis = 2), 3)
+
+
+
+def getCutoffConcepts (ticks, functionType):
+    if functionType == "gauss":
+        concepts = estimateGaussianConcept (ticks)
+        return np.concatenate ([concepts, np.full (concepts.shape, np.nan)], axis = 2)
+    return ticks
 
 
 
 def estimatorByCutoff (mtx, numFuzzySets, functionType, fuzzyBy = "feature", cutoffBy = "proportion",
-                       percents = list (), slope = list (), labelValues = list ()):
+                       percents = list (), slope = list (), labelValues = list (), valueRange = None, n_jobs = 1):
     match fuzzyBy:
         case "feature":
             matrix = mtx.replace (labelValues, np.nan)
@@ -113,31 +179,37 @@ def estimatorByCutoff (mtx, numFuzzySets, functionType, fuzzyBy = "feature", cut
             matrix = pd.DataFrame (mtx.replace (labelValues, np.nan).melt ()["value"]).T
         case _:
             raise ValueError
-    valueRange = [np.floor (matrix.min (axis = None, skipna = True)) - 1, np.ceil (matrix.max (axis = None, skipna = True)) + 1]
-    match cutoffBy:
-        case "proportion":
-            ticks = matrix.quantile (np.linspace (0, 1, 1001), axis = 1, numeric_only = True).T
-            ticks = ticks.round (3).rename (columns = {ticks.columns[i]: i for i in range (1001)})
-            ticks[0] = np.floor (ticks[0]) - 1; ticks[1000] + np.ceil (ticks[1000]) + 1
-        case "width":
-            ticks = pd.DataFrame ({"min": np.floor (matrix.min (axis = 1, skipna = True)) - 1,
-                                   "max": np.ceil (matrix.max (axis = 1, skipna = True)) + 1})
-            ticks.loc[np.isnan (ticks["min"]), "min"] = valueRange[0]
-            ticks.loc[np.isnan (ticks["max"]), "max"] = valueRange[1]
-            ticks = ticks.apply (lambda x: np.linspace (x["min"], x["max"], 1001), axis = 1, result_type = "expand")
-            ticks = ticks.round (3).rename (columns = {ticks.columns[i]: i for i in range (1001)})
-        case _:
-            raise ValueError
-    match functionType:
-        case "trapezoidal":
-            allFC = estimateTrapezoidalConcept (ticks, numFuzzySets, percents = percents, slope = slope)
-        case "gauss":
-            allFC = estimateGaussianConcept (ticks, numFuzzySets, percents = percents)
-    return allFC
+    if valueRange is None:
+        valueRange = [np.floor (matrix.min (axis = None, skipna = True)) - 1, np.ceil (matrix.max (axis = None, skipna = True)) + 1]
+    if n_jobs > 1 and fuzzyBy != "matrix" and matrix.shape[0] > 1:
+        return estimateParallel (estimatorByCutoff, matrix, n_jobs, numFuzzySets = numFuzzySets, functionType = functionType,
+                                 cutoffBy = cutoffBy, percents = percents, slope = slope, valueRange = valueRange)
+    positions = getTickPositions (numFuzzySets, functionType, percents = percents, slope = slope); tickIdx = np.unique (positions)
+    ticks = getTicks (matrix, tickIdx, cutoffBy = cutoffBy, valueRange = valueRange)[:, np.searchsorted (tickIdx, positions)]
+    return ConceptBank.fromArrays (getCutoffConcepts (ticks, functionType), functionType == "gauss", matrix.index)
+
+
+
+def getPercentiles (functionType, params):
+    return (params.ravel () if functionType == "trapezoidal" else params[:, 0]).astype (float)
 
 
 
-def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature", paramBy = "fix", labelValues = list ()):
+def getPercentileConcepts (quantiles, minimum, maximum, functionType, params):
+    if functionType == "trapezoidal":
+        concepts = np.round (quantiles.reshape ((-1,) + params.shape), 3); empty = np.isnan (concepts).all (axis = (1, 2))
+        concepts[:, 0, :2] = (np.floor (minimum) - 1)[:, None]; concepts[:, -1, -2:] = (np.ceil (maximum) + 1)[:, None]; concepts[empty] = 0
+    else:
+        fct = 2 * np.sqrt (2 * np.log (2))
+        missIdx = np.where ([not isinstance (p, (int, float)) or np.isnan (p) or not np.isfinite (p) for p in params[:, 1]])[0]
+        center = np.round (quantiles, 3); gaps = np.diff (center, axis = 1) / fct
+        std = np.tile (params[:, 1], (center.shape[0], 1)); std[:, missIdx] = np.column_stack ([gaps[:, :1], gaps])[:, missIdx]
+        concepts = np.round (np.stack ([center, std.astype (float)], axis = 2), 3); concepts[np.isnan (center).all (axis = 1)] = 0
+    return concepts
+
+
+
+def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature", paramBy = "fix", labelValues = list (), n_jobs = 1):
     if isinstance (functionParams, list) and all ([isinstance (x, list) for x in functionParams]):
         params = np.array (functionParams)
     elif type (functionParams).__module__ == np.__name__:
@@ -153,6 +225,9 @@ def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature"
             matrix = pd.DataFrame (mtx.replace (labelValues, np.nan).melt ()["value"]).T
         case _:
             raise ValueError
+    if n_jobs > 1 and fuzzyBy != "matrix" and matrix.shape[0] > 1:
+        return estimateParallel (estimatorByParameter, matrix, n_jobs, functionType = functionType, functionParams = params,
+                                 paramBy = paramBy)
     if functionType == "trapezoidal":
         if params.shape[1] != 4:
             raise ValueError
@@ -164,16 +239,12 @@ def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature"
                 params[0, 0] = minimum; params[0, 1] = minimum; params[-1, 2] = maximum; params[-1, 3] = maximum
                 allFC[feature] = params.tolist ()
         elif paramBy == "percentile":
-            allFC = {feature: np.round ([matrix.loc[feature].dropna ().quantile (p).tolist () for p in params], 3)
-                     for feature in matrix.index}
-            for feature in matrix.index:
-                if np.isnan (allFC[feature]).all ():
-                    allFC[feature] = np.zeros (params.shape)
-                else:
-                    minimum = np.floor (matrix.loc[feature].min (skipna = True)) - 1
-                    maximum = np.ceil (matrix.loc[feature].max (skipna = True)) + 1
-                    allFC[feature][0, 0], allFC[feature][0, 1] = minimum, minimum
-                    allFC[feature][-1, -2], allFC[feature][-1, -1] = maximum, maximum
+            values = matrix.to_numpy (dtype = float)
+            with warnings.catch_warnings ():
+                warnings.simplefilter ("ignore", category = RuntimeWarning)
+                quantiles = np.nanquantile (values, getPercentiles (functionType, params), axis = 1).T
+                concepts = getPercentileConcepts (quantiles, np.nanmin (values, axis = 1), np.nanmax (values, axis = 1), functionType, params)
+            allFC = dict (zip (matrix.index, concepts))
         else:
             raise ValueError
     elif functionType == "gauss":
@@ -182,31 +253,64 @@ def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature"
         if paramBy == "fix":
             allFC = {feature: params.tolist () for feature in matrix.index}
         elif paramBy == "percentile":
-            allFC = dict (); fct = 2 * np.sqrt (2 * np.log (2))
-            missIdx = np.where ([not isinstance (p, (int, float)) or np.isnan (p) or not np.isfinite (p) for p in params[:, 1]])[0]
-            for feature in matrix.index:
-                center = np.round (matrix.loc[feature].dropna ().quantile (params[:, 0]).tolist (), 3)
-                if np.isnan (center).all ():
-                    allFC[feature] = np.zeros (params.shape)
-                else:
-                    std = params[:, 1].copy ()
-                    for idx in missIdx:
-                        if idx == 0:
-                            std[idx] = (center[idx + 1] - center[idx]) / fct
-                        else:
-                            std[idx] = (center[idx] - center[idx - 1]) / fct
-                    allFC[feature] = np.round ([center, std.astype (float)], 3).T
+            with warnings.catch_warnings ():
+                warnings.simplefilter ("ignore", category = RuntimeWarning)
+                quantiles = np.nanquantile (matrix.to_numpy (dtype = float), getPercentiles (functionType, params), axis = 1).T
+            allFC = dict (zip (matrix.index, getPercentileConcepts (quantiles, None, None, functionType, params)))
         else:
             raise ValueError
     else:
         raise ValueError
     if fuzzyBy == "matrix":
         allFC = {feature: allFC["value"] for feature in mtx.index}
-    return allFC
+    return ConceptBank.fromFeatures (allFC)
+
+
+
+def sketchEstimatorByCutoff (sketch, numFuzzySets, functionType, percents = list (), slope = list ()):
+    positions = getTickPositions (numFuzzySets, functionType, percents = percents, slope = slope); tickIdx = np.unique (positions)
+    ticks = roundTicks (sketch.quantile (np.linspace (0, 1, 1001)[tickIdx]), tickIdx)[:, np.searchsorted (tickIdx, positions)]
+    return ConceptBank.fromArrays (getCutoffConcepts (ticks, functionType), functionType == "gauss", sketch.index)
+
+
+
+def sketchEstimatorByParameter (sketch, functionType, functionParams):
+    params = np.array (functionParams)
+    if functionType not in ["trapezoidal", "gauss"] or params.shape[1] != (4 if functionType == "trapezoidal" else 2):
+        raise ValueError
+    concepts = getPercentileConcepts (sketch.quantile (getPercentiles (functionType, params)), sketch.minimum, sketch.maximum,
+                                      functionType, params)
+    return ConceptBank.fromFeatures (dict (zip (sketch.index, concepts)))
+
+
+
+def estimateDensity (values, bwFactor = 1, kdeMethod = "exact", gridSize = 1024):
+    if kdeMethod == "exact":
+        kernel = stats.gaussian_kde (values); kernel.set_bandwidth (bw_method = bwFactor * kernel.factor)
+        density = pd.DataFrame ({"value": values, "density": kernel (values)}).sort_values ("value").drop_duplicates ()
+    elif kdeMethod == "binned":
+        x = np.asarray (values, dtype = float); bandwidth = bwFactor * np.std (x, ddof = 1) * len (x) ** (-1 / 5)
+        if not np.isfinite (bandwidth) or bandwidth <= 0:
+            raise np.linalg.LinAlgError
+        grid = np.linspace (x.min () - 4 * bandwidth, x.max () + 4 * bandwidth, gridSize); delta = grid[1] - grid[0]
+        pos = (x - grid[0]) / delta; left = np.clip (np.floor (pos).astype (int), 0, gridSize - 2); frac = pos - left
+        counts = np.bincount (left, weights = 1 - frac, minlength = gridSize) + np.bincount (left + 1, weights = frac, minlength = gridSize)
+        halfWidth = min (gridSize - 1, int (np.ceil (4 * bandwidth / delta))); offsets = np.arange (-halfWidth, halfWidth + 1)
+        weights = np.exp (-0.5 * (offsets * delta / bandwidth) ** 2) / (np.sqrt (2 * np.pi) * bandwidth * len (x))
+        gridDensity = np.clip (signal.fftconvolve (counts, weights, mode = "same"), 0, None)
+        density = pd.DataFrame ({"value": grid, "density": gridDensity})
+        kernel = lambda points: np.interp (points, grid, gridDensity)
+    else:
+        raise ValueError
+    return density, kernel
 
 
 
-def estimatorByDefault (mtx, numFuzzySets, widthFactor = 1, slopeFactor = 0.5, bwFactor = 1):
+def estimatorByDefault (mtx, numFuzzySets, widthFactor = 1, slopeFactor = 0.5, bwFactor = 1, kdeMethod = "exact", kdeGridSize = 1024,
+                        n_jobs = 1):
+    if n_jobs > 1 and mtx.shape[0] > 1:
+        return estimateParallel (estimatorByDefault, mtx, n_jobs, numFuzzySets = numFuzzySets, widthFactor = widthFactor,
+                                 slopeFactor = slopeFactor, bwFactor = bwFactor, kdeMethod = kdeMethod, kdeGridSize = kdeGridSize)
     finite_data = mtx.mask (~np.isfinite (mtx)); centerIdx = int (numFuzzySets / 2)
     fuzzyConcepts = dict ()
     for feature in mtx.index:
@@ -217,8 +321,7 @@ def estimatorByDefault (mtx, numFuzzySets, widthFactor = 1, slopeFactor = 0.5, b
             continue
         else:
             try:
-                kernel = stats.gaussian_kde (values); kernel.set_bandwidth (bw_method = bwFactor * kernel.factor)
-                density = pd.DataFrame ({"value": values, "density": kernel (values)}).sort_values ("value").drop_duplicates ()
+                density, kernel = estimateDensity (values, bwFactor = bwFactor, kdeMethod = kdeMethod, gridSize = kdeGridSize)
                 modes = density.iloc[signal.argrelmax (density["density"].to_numpy ())[0]].drop_duplicates ()
             except np.linalg.LinAlgError:
                 modes = pd.DataFrame (columns = ["value", "density"], dtype = float)
@@ -248,6 +351,6 @@ def estimatorByDefault (mtx, numFuzzySets, widthFactor = 1, slopeFactor = 0.5, b
         left = min (xRange[0], concept[0][3]); right = max (xRange[1], concept[-1][1])
         concept[0][0] = left; concept[0][1] = left; concept[-1][2] = right; concept[-1][3] = right
         concept[centerIdx] = [round (mu, 3), round (sigma, 3)]; fuzzyConcepts[feature] = concept
-    return fuzzyConcepts
+    return ConceptBank.fromFeatures (fuzzyConcepts, features = mtx.index)
 
 
@@ -1,5 +1,7 @@
+import warnings
 import numpy as np
 import pandas as pd
+from sparse import TopTwoMemberships, nanDtype
 
 
 
@@ -8,7 +10,8 @@ def fuzzify (rawValues, functionParams, furtherParams = dict ()):
     memberships = pd.DataFrame (index = rawValues.index, columns = [f"FS{i}" for i in range (1, len (functionParams) + 1)], dtype = float)
     if addIndicator:
         indicateValue = furtherParams.get ("indicateValue", [np.nan])
-        raw = rawValues.replace (indicateValue, np.nan).to_numpy ()
+        codes = labelCodes (rawValues.to_numpy (dtype = float), indicateValue)
+        raw = np.where (codes != 0, np.nan, rawValues.to_numpy (dtype = float))
     else:
         raw = rawValues.to_numpy ()
     index = rawValues.index
@@ -58,19 +61,202 @@ def fuzzify (rawValues, functionParams, furtherParams = dict ()):
             raise ValueError
     if addIndicator:
         memberships.loc[np.isnan (raw)] = 0
-        for val in indicateValue[::-1]:
-            if val is None:
-                memberships.insert (0, f"FS0_{val}", np.array ([x is None for x in rawValues]).astype (float))
-            elif np.isnan (val):
-                memberships.insert (0, f"FS0_{val}", np.isnan (rawValues).astype (float))
-            elif not np.isfinite (val): # -np.inf or np.inf
-                if val < 0: # -np.inf
-                    memberships.insert (0, f"FS0_{val}", (~np.isfinite (rawValues.replace ([None, np.nan, np.inf], 0))).astype (float))
-                else: # np.inf
-                    memberships.insert (0, f"FS0_{val}", (~np.isfinite (rawValues.replace ([None, np.nan, -np.inf], 0))).astype (float))
-            else:
-                memberships.insert (0, f"FS0_{val}", np.array ([x == val for x in rawValues]).astype (float))
+        indicators = pd.DataFrame (labelIndicators (codes, indicateValue), index = index, columns = [f"FS0_{val}" for val in indicateValue])
+        memberships = pd.concat ([indicators, memberships], axis = 1)
     memberships.loc[memberships.sum (axis = 1) == 0, f"FS{len (functionParams)}"] = 1
     return memberships
 
 
+
+def stackConcepts (conceptList):
+    numSets = len (conceptList[0])
+    if any ([len (functionParams) != numSets for functionParams in conceptList]):
+        raise ValueError
+    concepts = np.full ((len (conceptList), numSets, 4), np.nan); isGauss = np.zeros ((len (conceptList), numSets), dtype = bool)
+    for row, functionParams in enumerate (conceptList):
+        for idx, params in enumerate (functionParams):
+            if len (params) == 2:
+                isGauss[row, idx] = True
+            elif len (params) != 4:
+                raise ValueError
+            concepts[row, idx, :len (params)] = [float (x) for x in params]
+    return concepts, isGauss
+
+
+
+def labelIndex (labels):
+    first = dict (); index = list ()
+    for idx, val in enumerate (labels):
+        if val is None:
+            index.append (np.iinfo (np.int8).min)
+        else:
+            index.append (first.setdefault ("NaN" if np.isnan (val) else float (val), idx + 1))
+    if len (labels) > np.iinfo (np.int8).max:
+        raise ValueError
+    return np.array (index, dtype = np.int8)
+
+
+
+def labelCodes (values, labels):
+    values = np.asarray (values, dtype = float); index = labelIndex (labels)
+    codes = np.zeros (values.shape, dtype = np.int8); nanCode = -1; keys = dict ()
+    for val, code in zip (labels, index):
+        if val is not None and np.isnan (val):
+            nanCode = code
+        elif val is not None:
+            keys[float (val)] = code
+    if len (keys) > 0:
+        order = np.array (sorted (keys)); orderCodes = np.array ([keys[x] for x in order], dtype = np.int8)
+        position = np.minimum (np.searchsorted (order, values), len (order) - 1)
+        match = order[position] == values
+        codes[match] = orderCodes[position[match]]
+    codes[np.isnan (values)] = nanCode
+    return codes
+
+
+
+def labelIndicators (codes, labels):
+    return (codes[..., None] == labelIndex (labels)).astype (float)
+
+
+
+def maskLabels (values, labels):
+    return labelCodes (values, labels) > 0
+
+
+
+def denseMemberships (raw, concepts, isGauss):
+    numSets = concepts.shape[1]; firstRight = concepts[:, 0, 2, None]
+    with np.errstate (divide = "ignore", invalid = "ignore", over = "ignore"):
+        for idx in range (numSets):
+            p0, p1, p2, p3 = [concepts[:, idx, i, None] for i in range (4)]
+            gauss = isGauss[:, idx, None]
+            if gauss.any ():
+                if idx == 0:
+                    platform = (raw <= p0).astype (int)
+                    gaussValues = platform + (1 - platform) * np.exp (-((raw - p0) ** 2) / (2 * (p1 ** 2)))
+                elif idx == numSets - 1:
+                    platform = (raw >= p0).astype (int)
+                    gaussValues = platform + (1 - platform) * np.exp (-((raw - p0) ** 2) / (2 * (p1 ** 2)))
+                else:
+                    gaussValues = np.exp (-((raw - p0) ** 2) / (2 * (p1 ** 2)))
+                gaussValues[gaussValues < 1e-5] = 0
+            if not gauss.all ():
+                if idx == 0:
+                    trapValues = np.where (p2 == p3, (raw < p2).astype (float), np.clip ((p3 - raw) / (p3 - p2), 0, 1))
+                elif idx == numSets - 1:
+                    trapValues = np.where (p0 == p1, np.where (firstRight == p0, 0.0, (raw > p1).astype (float)),
+                                           np.clip ((p0 - raw) / (p0 - p1), 0, 1))
+                else:
+                    leftSlope = np.where (p0 == p1, 0.0, (raw < p1).astype (int) * np.clip ((p0 - raw) / (p0 - p1), 0, None))
+                    middle = ((raw >= p1).astype (int) * (raw <= p2).astype (int))
+                    rightSlope = np.where (p2 == p3, 0.0, (raw > p2).astype (int) * np.clip ((p3 - raw) / (p3 - p2), 0, None))
+                    trapValues = leftSlope + middle + rightSlope
+                trapValues = np.where ((p0 == p1) & (p1 == p2) & (p2 == p3), 0.0, trapValues)
+            if gauss.all ():
+                yield idx, gaussValues
+            elif gauss.any ():
+                yield idx, np.where (gauss, gaussValues, trapValues)
+            else:
+                yield idx, trapValues
+
+
+
+def isTrapezoidPartition (concepts, isGauss):
+    if concepts.shape[1] < 2 or isGauss.any ():
+        return False
+    edges = concepts[:, :-1, 2:]
+    valid = (concepts[:, 1:, :2] == edges).all () and np.isfinite (edges).all ()
+    valid &= (edges[:, :, 0] <= edges[:, :, 1]).all () and (edges[:, 1:, 0] > edges[:, :-1, 1]).all ()
+    valid &= not ((concepts[..., 0] == concepts[..., 1]) & (concepts[..., 1] == concepts[..., 2]) & (concepts[..., 2] == concepts[..., 3])).any ()
+    return bool (valid)
+
+
+
+def searchTrapezoid (raw, concepts):
+    numSets = concepts.shape[1]; lower = concepts[:, :-1, 2]; upper = concepts[:, :-1, 3]
+    segment = np.empty (raw.shape, dtype = int)
+    for row in range (raw.shape[0]):
+        segment[row] = np.searchsorted (upper[row], raw[row], side = "left")
+    edge = (np.arange (raw.shape[0]) * (numSets - 1))[:, None] + np.minimum (segment, numSets - 2)
+    segment = segment.ravel (); values = raw.ravel (); left = lower.ravel ()[edge.ravel ()]; right = upper.ravel ()[edge.ravel ()]
+    memberships = np.zeros ((len (values), numSets)); position = np.arange (len (values)) * numSets + segment
+    memberships.ravel ()[position] = 1
+    inner = segment < numSets - 1
+    slope = np.flatnonzero (inner & (values > left))
+    x = values[slope]; slopeLeft = left[slope]; slopeRight = right[slope]
+    with np.errstate (divide = "ignore", invalid = "ignore"):
+        memberships.ravel ()[position[slope]] = (slopeRight - x) / (slopeRight - slopeLeft)
+        memberships.ravel ()[position[slope] + 1] = (slopeLeft - x) / (slopeLeft - slopeRight)
+    onEdge = inner & (values == left)
+    point = np.flatnonzero (onEdge & (left == right))
+    memberships[point, segment[point]] = (segment[point] > 0).astype (float)
+    memberships[point, segment[point] + 1] = (segment[point] < numSets - 2).astype (float)
+    memberships[onEdge & (left != right) & (segment == numSets - 2), -1] = -0.0
+    lastZero = (concepts[:, -1, 0] == concepts[:, -1, 1]) & (concepts[:, 0, 2] == concepts[:, -1, 0])
+    if lastZero.any ():
+        memberships[~inner & np.repeat (lastZero, raw.shape[1]), -1] = 0
+    memberships = memberships.reshape (raw.shape + (numSets,))
+    rows, cols = np.where (~np.isfinite (raw))
+    if len (rows) > 0:
+        for idx, setValues in denseMemberships (raw[rows, cols, None], concepts[rows], np.zeros (concepts.shape[:2], dtype = bool)[rows]):
+            memberships[rows, cols, idx] = setValues[:, 0]
+    return memberships
+
+
+
+def iterMemberships (values, concepts, isGauss, furtherParams = dict (), codes = None):
+    addIndicator = furtherParams.get ("addIndicator", False)
+    indicateValue = furtherParams.get ("indicateValue", [np.nan]) if addIndicator else list ()
+    values = np.asarray (values, dtype = float); numInd = len (indicateValue)
+    if addIndicator:
+        codes = labelCodes (values, indicateValue) if codes is None else codes
+        raw = np.where (codes != 0, np.nan, values); indicators = labelIndicators (codes, indicateValue)
+        for idx in range (numInd):
+            yield idx, indicators[:, :, idx]
+    else:
+        raw = values
+    if isTrapezoidPartition (concepts, isGauss):
+        searched = searchTrapezoid (raw, concepts)
+        setMemberships = ((idx, searched[:, :, idx]) for idx in range (concepts.shape[1]))
+    else:
+        setMemberships = denseMemberships (raw, concepts, isGauss)
+    for idx, memberships in setMemberships:
+        if addIndicator:
+            memberships[codes != 0] = 0
+        yield numInd + idx, memberships
+
+
+
+def fuzzify_matrix (values, concepts, isGauss, furtherParams = dict (), codes = None):
+    indicateValue = furtherParams.get ("indicateValue", [np.nan]) if furtherParams.get ("addIndicator", False) else list ()
+    numSets = concepts.shape[1]; numInd = len (indicateValue)
+    memberships = np.empty (np.shape (values) + (numInd + numSets,))
+    for idx, setValues in iterMemberships (values, concepts, isGauss, furtherParams = furtherParams, codes = codes):
+        memberships[:, :, idx] = setValues
+    memberships[np.nansum (memberships, axis = 2) == 0, -1] = 1
+    allSets = [f"FS0_{val}" for val in indicateValue] + [f"FS{i}" for i in range (1, numSets + 1)]
+    return memberships, allSets
+
+
+
+def fuzzify_top2 (values, concepts, isGauss, furtherParams = dict (), codes = None):
+    indicateValue = furtherParams.get ("indicateValue", [np.nan]) if furtherParams.get ("addIndicator", False) else list ()
+    numSets = concepts.shape[1]; numInd = len (indicateValue); numAll = numInd + numSets
+    sets = np.full (np.shape (values) + (2,), -1, dtype = np.int8); top = np.zeros (np.shape (values) + (2,)); total = np.zeros (np.shape (values))
+    nanSets = np.zeros (np.shape (values), dtype = nanDtype (numAll))
+    for idx, setValues in iterMemberships (values, concepts, isGauss, furtherParams = furtherParams, codes = codes):
+        missing = np.isnan (setValues); total += np.where (missing, 0, setValues); nanSets |= missing.astype (nanSets.dtype) << idx
+        second = setValues > top[:, :, 1]
+        top[second, 1] = setValues[second]; sets[second, 1] = idx
+        swap = top[:, :, 1] > top[:, :, 0]
+        top[swap] = top[swap][:, ::-1]; sets[swap] = sets[swap][:, ::-1]
+    empty = total == 0
+    top[empty, 0] = 1; sets[empty, 0] = numAll - 1; nanSets[empty] &= ~nanSets.dtype.type (1 << (numAll - 1))
+    dropped = total - top.sum (axis = 2)
+    if (dropped > 1e-3).any ():
+        warnings.warn (f"{(dropped > 1e-3).sum ()} value(s) with non-zero membership in more than two fuzzy sets.")
+    allSets = [f"FS0_{val}" for val in indicateValue] + [f"FS{i}" for i in range (1, numSets + 1)]
+    return TopTwoMemberships (sets, top, numAll, nanSets = nanSets), allSets
+
+
@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from cache import hashFile
+from concepts import ConceptBank
+
+RECORD = "fuzzyConcepts.npz"
+RUN = "fuzzyRun.json"
+
+
+
+def runInfo (files, params):
+    info = {"files": [hashFile (hashlib.sha256 (), path).hexdigest () for path in files]}
+    info.update (params)
+    return json.loads (json.dumps (info, sort_keys = True, default = lambda x: x.item () if hasattr (x, "item") else str (x)))
+
+
+
+def saveRecord (output, fuzzyConcepts, info):
+    fuzzyConcepts.save (os.path.join (output, RECORD))
+    with open (os.path.join (output, RUN), "w", encoding = "utf-8") as f:
+        json.dump (info, f, ensure_ascii = False, indent = 4)
+
+
+
+def loadRecord (output):
+    if not os.path.exists (os.path.join (output, RECORD)) or not os.path.exists (os.path.join (output, RUN)):
+        return None, None
+    with open (os.path.join (output, RUN)) as f:
+        info = json.load (f)
+    return ConceptBank.load (os.path.join (output, RECORD)), info
+
+
+
+def changedConcepts (old, new):
+    if old.clusters != new.clusters or set (old.features) != set (new.features) or old.numSets != new.numSets:
+        return None
+    idx = np.array ([old.featureIndex[feature] for feature in new.features], dtype = int)
+    params = old.params[:, idx]; isGauss = old.isGauss[:, idx]; defined = old.defined[:, idx]
+    changed = ~((params == new.params) | (np.isnan (params) & np.isnan (new.params))).all (axis = (2, 3))
+    changed |= (isGauss != new.isGauss).any (axis = 2) | (defined != new.defined)
+    return changed
+
+
+
+def patchTSV (path, values, features, samples):
+    mtx = pd.read_csv (path, index_col = 0, sep = "\t", float_precision = "round_trip")
+    mtx.loc[features, samples] = values
+    mtx.to_csv (path, sep = "\t")
+
+
+
+def appendTSV (path, values):
+    mtx = pd.read_csv (path, index_col = 0, sep = "\t", float_precision = "round_trip")
+    if values.columns.isin (mtx.columns).any () or set (values.index) != set (mtx.index):
+        raise ValueError
+    pd.concat ([mtx, values.loc[mtx.index]], axis = 1).to_csv (path, sep = "\t")
+
+
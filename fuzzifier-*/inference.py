@@ -0,0 +1,66 @@
+import numpy as np
+
+AGGREGATES = {"low": ["FS1", "FS2"], "mid": ["FS3"], "high": ["FS4", "FS5"]}
+RULES = {"NA": [["NA", "NA"]], "-INF": [["NA", "high"]], "INF": [["high", "NA"]],
+         "--": [["NA", "mid"], ["low", "high"]], "-": [["NA", "low"], ["low", "mid"], ["mid", "high"]],
+         "o": [["low", "low"], ["mid", "mid"], ["high", "high"]],
+         "+": [["low", "NA"], ["mid", "low"], ["high", "mid"]], "++": [["mid", "NA"], ["high", "low"]]}
+TNORMS = {"product": np.multiply, "minimum": np.minimum,
+          "lukasiewicz": lambda a, b: np.maximum (a + b - 1, 0)}
+TCONORMS = {"sum": np.add, "maximum": np.maximum,
+            "probabilistic_sum": lambda a, b: a + b - a * b, "lukasiewicz": lambda a, b: np.minimum (a + b, 1)}
+
+
+
+class RuleMatrix:
+    def __init__ (self, aggregates = AGGREGATES, rules = RULES, tNorm = "product", tConorm = "sum"):
+        if tNorm not in TNORMS or tConorm not in TCONORMS:
+            raise ValueError
+        self.tNorm = TNORMS[tNorm]; self.tConorm = TCONORMS[tConorm]
+        self.aggregates = ["NA"] + list (aggregates.keys ()); self.outputSets = list (rules.keys ())
+        self.inputSets = list (dict.fromkeys ([nameFS for sets in aggregates.values () for nameFS in sets]))
+        if len (set (self.aggregates)) != len (self.aggregates) or any ([len (sets) == 0 for sets in aggregates.values ()]):
+            raise ValueError
+        self.members = np.zeros ((len (self.inputSets), len (self.aggregates)), dtype = bool)
+        for idx, sets in enumerate (aggregates.values (), start = 1):
+            self.members[[self.inputSets.index (nameFS) for nameFS in sets], idx] = True
+        aggIndex = {name: idx for idx, name in enumerate (self.aggregates)}
+        self.table = np.zeros ((len (self.aggregates), len (self.aggregates), len (self.outputSets)), dtype = bool)
+        for idx, pairs in enumerate (rules.values ()):
+            if any ([len (pair) != 2 or pair[0] not in aggIndex or pair[1] not in aggIndex for pair in pairs]):
+                raise ValueError
+            for num, den in pairs:
+                self.table[aggIndex[num], aggIndex[den], idx] = True
+
+
+    @classmethod
+    def fromConfig (cls, config):
+        return cls (config.get ("input_fuzzy_sets", AGGREGATES), config.get ("rule_table", RULES),
+                    tNorm = config.get ("t_norm", "product"), tConorm = config.get ("t_conorm", "sum"))
+
+
+    def aggregate (self, values):
+        result = np.empty (values.shape[:2] + (len (self.aggregates),))
+        result[:, :, 0] = (values == 0).all (axis = 2)
+        for idx in range (1, len (self.aggregates)):
+            sets = np.where (self.members[:, idx])[0]
+            result[:, :, idx] = values[:, :, sets[0]]
+            for setIdx in sets[1:]:
+                result[:, :, idx] += values[:, :, setIdx]
+        return result
+
+
+    def apply (self, numerator, denominator, blockSize = None):
+        result = np.zeros (numerator.shape[:2] + (len (self.outputSets),))
+        blockSize = numerator.shape[0] if blockSize is None else blockSize
+        pairs = [np.argwhere (self.table[:, :, idx]) for idx in range (len (self.outputSets))]
+        for start in range (0, numerator.shape[0], max (1, blockSize)):
+            rows = slice (start, start + blockSize)
+            num = self.aggregate (numerator[rows]); den = self.aggregate (denominator[rows])
+            for idx in range (len (self.outputSets)):
+                for k, l in pairs[idx]:
+                    result[rows, :, idx] = self.tConorm (result[rows, :, idx], self.tNorm (num[:, :, k], den[:, :, l]))
+        return result
+
+
+
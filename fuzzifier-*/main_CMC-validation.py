@@ -6,6 +6,20 @@ import pandas as pd
 # python main_CMC-validation.py --data rawDataDirectory --metadata metadata --result comparisonResults --reference directoryCMC --cmcCut scoreCutoff
 
 
+def fractionExpressed (mtx, metadata, clusters):
+    clustering = pd.crosstab (metadata["sample"], metadata["context"]).reindex (index = mtx.columns, columns = clusters, fill_value = 0)
+    counts = np.isfinite (mtx.to_numpy (dtype = float)) @ clustering.to_numpy (dtype = float)
+    return pd.DataFrame (counts / clustering.sum (axis = 0).to_numpy (), index = mtx.index, columns = clusters)
+
+
+
+def filterExpressed (novels, expressed):
+    novels = novels.merge (expressed, left_on = ["feature", "cluster"], right_index = True, how = "left")
+    pctExpressed = np.where (novels["regulation"] == "--", novels["denominator"], novels["numerator"])
+    return novels.loc[pctExpressed > 0.5].drop (["numerator", "denominator"], axis = 1)
+
+
+
 def main ():
     parser = argparse.ArgumentParser ()
     parser.add_argument ("--data", type = str, required = True, help = "Directory for splitted matrices")
@@ -25,6 +39,10 @@ def main ():
     numClusters = candidates.drop ("method", axis = 1).drop_duplicates ().value_counts ("feature")
     markers = candidates.loc[candidates["feature"].isin (numClusters[numClusters == 1].index)]
 
+    clusters = sorted (set (metadata["context"]))
+    expressed = pd.DataFrame ({"numerator": fractionExpressed (numerator, metadata, clusters).stack (),
+                               "denominator": fractionExpressed (denominator, metadata, clusters).stack ()})
+
     known_specific = pd.read_csv (os.path.join (args.reference, "known_cancer-specific.tsv"), index_col = None, sep = "\t")
     known_specific = known_specific.loc[known_specific["CMC_score"] >= args.cmcCut]
     known_regulation = pd.read_csv (os.path.join (args.reference, "known_CMC_regulation.tsv"), index_col = None, sep = "\t")
@@ -35,16 +53,7 @@ def main ():
     validated = validated[["feature", "type", "cluster", "regulation_identified", "regulation_known", "CMC_score", "method"]]
     novels = candidates.merge (validated, on = ["feature", "cluster", "method"], how = "left")
     novels = novels.loc[np.isnan (novels["CMC_score"]), ["feature", "cluster", "regulation", "method"]]
-    idxList = list ()
-    for idx in novels.index:
-        feature, cluster, regulation = novels.loc[idx, ["feature", "cluster", "regulation"]]
-        if regulation == "--":
-            pctExpressed = np.isfinite (denominator.loc[feature, metadata.loc[metadata["context"] == cluster, "sample"]]).mean ()
-        else:
-            pctExpressed = np.isfinite (numerator.loc[feature, metadata.loc[metadata["context"] == cluster, "sample"]]).mean ()
-        if pctExpressed > 0.5:
-            idxList.append (idx)
-    novel_specific = novels.loc[idxList].merge (candidates, how = "left")
+    novel_specific = filterExpressed (novels, expressed).merge (candidates, how = "left")
 
     validated_markers = markers.merge (known_specific, on = ["feature", "cluster"], how = "inner")
     validated_markers = validated_markers.merge (known_regulation, on = ["feature", "cluster"], how = "left", suffixes = ("_identified", "_known")).replace (np.nan, "")
@@ -52,16 +61,7 @@ def main ():
     validated_markers = validated_markers[["feature", "type", "cluster", "regulation_identified", "regulation_known", "CMC_score", "method"]]
     novels = sorted (set (markers["feature"]) - set (validated_markers["feature"]))
     novels = markers.loc[markers["feature"].isin (novels)].drop ("method", axis = 1).drop_duplicates ()
-    idxList = list ()
-    for idx in novels.index:
-        feature, cluster, regulation = novels.loc[idx]
-        if regulation == "--":
-            pctExpressed = np.isfinite (denominator.loc[feature, metadata.loc[metadata["context"] == cluster, "sample"]]).mean ()
-        else:
-            pctExpressed = np.isfinite (numerator.loc[feature, metadata.loc[metadata["context"] == cluster, "sample"]]).mean ()
-        if pctExpressed > 0.5:
-            idxList.append (idx)
-    novel_markers = markers.merge (markers.loc[idxList, ["feature", "cluster", "regulation"]], how = "inner")
+    novel_markers = markers.merge (filterExpressed (novels, expressed)[["feature", "cluster", "regulation"]], how = "inner")
     
     dir = os.path.abspath (os.path.dirname (args.result))
     validated.to_csv (os.path.join (dir, "comparison_validated.tsv"), index = None, sep = "\t")
@@ -1,12 +1,39 @@
 import os
 import json
+import itertools
 import argparse
-import numpy as np
 import pandas as pd
+from membership import loadFuzzyValues, loadMemberships
+from aggregation import clusterAggregates, regulationSums, regulationCalls
 
 # python main_comparison.py --standard standardDirectory --raw rawDistanceDirectory --fuzzy fuzzyDistanceDirectory --DESeq2 DESeq2Directory --metadata metadata --config config --output outputDirectory
 
 
+THRESHOLDS = ["minimal_absolute_standard_log2FC", "maximal_-log10_standard_padj", "minimal_average_fuzzy_value", "minimal_percent_main_fuzzy_set"]
+
+
+
+def longFormat (candidates, method):
+    candidates = candidates.reset_index (names = "feature").melt (id_vars = "feature", var_name = "cluster", value_name = "regulation")
+    return candidates.loc[candidates["regulation"] != ""].assign (method = method)
+
+
+
+def getCandidates (stats, features, clusters, log2FC_cutoff, padj_cutoff, avgFV_cutoff, pctMainFS_cutoff):
+    log2FC, padj = stats["DESeq2 standard"]
+    candidates = pd.DataFrame ("", index = features, columns = clusters)
+    candidates = candidates.mask ((log2FC < -log2FC_cutoff) & (padj > padj_cutoff), "--")
+    candidates = candidates.mask ((log2FC > log2FC_cutoff) & (padj > padj_cutoff), "++")
+    results = [longFormat (candidates, "DESeq2 standard")]
+    calls = regulationCalls (stats["raw log2FC"], avgFV_cutoff, 0.8 * pctMainFS_cutoff)
+    results.append (longFormat (pd.DataFrame (calls, index = features, columns = clusters), "raw log2FC"))
+    calls = regulationCalls (stats["fuzzy rule"], 1.5 * avgFV_cutoff, pctMainFS_cutoff)
+    results.append (longFormat (pd.DataFrame (calls, index = features, columns = clusters), "fuzzy rule"))
+    results.append (stats["DESeq2 2-aspect"])
+    return [candidates for candidates in results if not candidates.empty]
+
+
+
 def main ():
     parser = argparse.ArgumentParser ()
     parser.add_argument ("--standard", type = str, required = True, help = "Directory of DESeq2 log2FC and padj files")
@@ -15,6 +42,8 @@ def main ():
     parser.add_argument ("--DESeq2", type = str, required = True, help = "Directory of DESeq2 2-aspect fuzzification")
     parser.add_argument ("--metadata", type = str, required = True, help = "Metadata containing clustering column (TSV)")
     parser.add_argument ("--config", type = str, required = True, help = "Config file for comparison argmuents (JSON)")
+    parser.add_argument ("--sweep", type = str, required = False, help = "Grid of threshold values to evaluate at once, as lists per threshold key (JSON)")
+    parser.add_argument ("--countsOnly", required = False, action = "store_true", help = "Whether to only report candidate counts per grid point in sweep mode")
     parser.add_argument ("--output", type = str, required = True, help = "Output directory for comparison files")
     args = parser.parse_args ()
 
@@ -30,86 +59,46 @@ def main ():
     allSets = config["fuzzy_variables"]
     log2FC_cutoff = config.get ("minimal_absolute_standard_log2FC", 1); padj_cutoff = config.get ("maximal_-log10_standard_padj", 1.3)
     avgFV_cutoff = config.get ("minimal_average_fuzzy_value", 0.5); pctMainFS_cutoff = config.get ("minimal_percent_main_fuzzy_set", 0.5)
-    rawFV = list (); fuzzyFV = list ()
-    for FS in allSets:
-        memberships = pd.read_csv (os.path.join (args.raw, f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-        rawFV.append (memberships.to_numpy ())
-    nameList = {"feature": list (memberships.index), "sample": list (memberships.columns)}
-    for FS in allSets:
-        memberships = pd.read_csv (os.path.join (args.fuzzy, "fuzzy_rule", f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-        fuzzyFV.append (memberships.loc[nameList["feature"], nameList["sample"]].to_numpy ())
-    rawFV = np.einsum ("ijk -> jki", rawFV); fuzzyFV = np.einsum ("ijk -> jki", fuzzyFV)
+    rawFV, features, samples = loadMemberships (args.raw, allSets)
+    nameList = {"feature": features, "sample": samples}
+    fuzzyFV, _, _ = loadMemberships (os.path.join (args.fuzzy, "fuzzy_rule"), allSets, features = features, samples = samples)
     metadata = metadata.set_index (indexCol).loc[nameList["sample"]].reset_index (); allClusters = sorted (set (metadata[clusterCol]))
-    clustering = metadata.rename (columns = {"index": "index_1"}).reset_index ().groupby (clusterCol)["index"].agg (list).to_dict ()
-
-    results = list ()
+    clusterCodes = pd.Index (allClusters).get_indexer (metadata[clusterCol])
 
-    candidates = pd.DataFrame ("", index = nameList["feature"], columns = allClusters)
-    candidates = candidates.mask ((log2FC < -log2FC_cutoff) & (padj > padj_cutoff), "--")
-    candidates = candidates.mask ((log2FC > log2FC_cutoff) & (padj > padj_cutoff), "++")
-    candidates = candidates.reset_index (names = "feature").melt (id_vars = "feature", var_name = "cluster", value_name = "regulation")
-    candidates = candidates.loc[candidates["regulation"] != ""]
-    if not candidates.empty:
-        candidates["method"] = "DESeq2 standard"
-        results.append (candidates)
+    stats = {"DESeq2 standard": (log2FC, padj)}
+    stats["raw log2FC"] = regulationSums (*clusterAggregates (rawFV, clusterCodes, len (allClusters)), allSets)
+    stats["fuzzy rule"] = regulationSums (*clusterAggregates (fuzzyFV, clusterCodes, len (allClusters)), allSets)
     
-    allPctMainFS = pd.DataFrame (rawFV.argmax (axis = 2), index = nameList["feature"], columns = nameList["sample"])
-    allPctMainFS = allPctMainFS.reset_index ().melt (id_vars = "index")
-    allPctMainFS["cluster"] = metadata.set_index (indexCol).loc[allPctMainFS["variable"], clusterCol].values
-    allPctMainFS = allPctMainFS.groupby (["index", "cluster"])["value"].value_counts (normalize = True).reset_index ()
-    allPctMainFS["value"] = allPctMainFS["value"].replace (dict (zip (range (len (allSets)), allSets)))
-    candidates = pd.DataFrame ("", index = nameList["feature"], columns = allClusters)
-    for cluster in allClusters:
-        avgFV = pd.DataFrame (rawFV[:, clustering[cluster], :].mean (axis = 1), index = nameList["feature"], columns = allSets)
-        pctMainFS = allPctMainFS.loc[allPctMainFS["cluster"] == cluster].pivot (index = "index", columns = "value", values = "proportion")
-        pctMainFS = pctMainFS.rename_axis (None, axis = 0).rename_axis (None, axis = 1)
-        pctMainFS = pd.concat ([pctMainFS, pd.DataFrame (0, index = nameList["feature"], columns = list (set (allSets) - set (pctMainFS.columns)))], axis = 1)
-        pctMainFS = pctMainFS[allSets].replace (np.nan, 0)
-        candidates.loc[(avgFV["-INF"] + avgFV["--"] + avgFV["-"] > avgFV_cutoff) & (pctMainFS["-INF"] + pctMainFS["--"] + pctMainFS["-"] > 0.8 * pctMainFS_cutoff), cluster] = "--"
-        candidates.loc[(avgFV["INF"] + avgFV["++"] + avgFV["+"] > avgFV_cutoff) & (pctMainFS["INF"] + pctMainFS["++"] + pctMainFS["+"] > 0.8 * pctMainFS_cutoff), cluster] = "++"
-    candidates = candidates.reset_index (names = "feature").melt (id_vars = "feature", var_name = "cluster", value_name = "regulation")
-    candidates = candidates.loc[candidates["regulation"] != ""]
-    if not candidates.empty:
-        candidates["method"] = "raw log2FC"
-        results.append (candidates)
-
-    allPctMainFS = pd.DataFrame (fuzzyFV.argmax (axis = 2), index = nameList["feature"], columns = nameList["sample"])
-    allPctMainFS = allPctMainFS.reset_index ().melt (id_vars = "index")
-    allPctMainFS["cluster"] = metadata.set_index (indexCol).loc[allPctMainFS["variable"], clusterCol].values
-    allPctMainFS = allPctMainFS.groupby (["index", "cluster"])["value"].value_counts (normalize = True).reset_index ()
-    allPctMainFS["value"] = allPctMainFS["value"].replace (dict (zip (range (len (allSets)), allSets)))
-    candidates = pd.DataFrame ("", index = nameList["feature"], columns = allClusters)
-    for cluster in allClusters:
-        avgFV = pd.DataFrame (fuzzyFV[:, clustering[cluster], :].mean (axis = 1), index = nameList["feature"], columns = allSets)
-        pctMainFS = allPctMainFS.loc[allPctMainFS["cluster"] == cluster].pivot (index = "index", columns = "value", values = "proportion")
-        pctMainFS = pctMainFS.rename_axis (None, axis = 0).rename_axis (None, axis = 1)
-        pctMainFS = pd.concat ([pctMainFS, pd.DataFrame (0, index = nameList["feature"], columns = list (set (allSets) - set (pctMainFS.columns)))], axis = 1)
-        pctMainFS = pctMainFS[allSets].replace (np.nan, 0)
-        candidates.loc[(avgFV["-INF"] + avgFV["--"] + avgFV["-"] > 1.5 * avgFV_cutoff) & (pctMainFS["-INF"] + pctMainFS["--"] + pctMainFS["-"] > pctMainFS_cutoff), cluster] = "--"
-        candidates.loc[(avgFV["INF"] + avgFV["++"] + avgFV["+"] > 1.5 * avgFV_cutoff) & (pctMainFS["INF"] + pctMainFS["++"] + pctMainFS["+"] > pctMainFS_cutoff), cluster] = "++"
-    candidates = candidates.reset_index (names = "feature").melt (id_vars = "feature", var_name = "cluster", value_name = "regulation")
-    candidates = candidates.loc[candidates["regulation"] != ""]
-    if not candidates.empty:
-        candidates["method"] = "fuzzy rule"
-        results.append (candidates)
-    
-    log2FC_FV = list (); padj_FV = list ()
-    for FS in ["--", "-", "o", "+", "++"]:
-        memberships = pd.read_csv (os.path.join (args.DESeq2, "log2FC", f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-        log2FC_FV.append (memberships.to_numpy ())
-    nameList = {"feature": list (memberships.index), "sample": list (memberships.columns)}
-    for FS in ["o", "*", "**", "***", "****"]:
-        memberships = pd.read_csv (os.path.join (args.DESeq2, "padj", f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-        padj_FV.append (memberships.loc[nameList["feature"], nameList["sample"]].to_numpy ())
-    log2FC_FV = np.einsum ("ijk -> jki", log2FC_FV); padj_FV = np.einsum ("ijk -> jki", padj_FV)
-    candidates = pd.DataFrame ("", index = nameList["feature"], columns = allClusters)
+    log2FC_FV, features, samples = loadFuzzyValues (os.path.join (args.DESeq2, "log2FC"), ["--", "-", "o", "+", "++"])
+    padj_FV, _, _ = loadFuzzyValues (os.path.join (args.DESeq2, "padj"), ["o", "*", "**", "***", "****"], features = features, samples = samples)
+    candidates = pd.DataFrame ("", index = features, columns = allClusters)
     candidates = candidates.mask (((log2FC_FV[:, :, 0] > 0) | (log2FC_FV[:, :, 1] == 1)) & (padj_FV[:, :, 4] > 0), "--")
     candidates = candidates.mask (((log2FC_FV[:, :, 3] == 1) | (log2FC_FV[:, :, 4] > 0)) & (padj_FV[:, :, 4] > 0), "++")
-    candidates = candidates.reset_index (names = "feature").melt (id_vars = "feature", var_name = "cluster", value_name = "regulation")
-    candidates = candidates.loc[candidates["regulation"] != ""]
-    if not candidates.empty:
-        candidates["method"] = "DESeq2 2-aspect"
-        results.append (candidates)
+    stats["DESeq2 2-aspect"] = longFormat (candidates, "DESeq2 2-aspect")
+
+    if args.sweep is not None:
+        with open (args.sweep) as f:
+            sweep = json.load (f)
+        current = [log2FC_cutoff, padj_cutoff, avgFV_cutoff, pctMainFS_cutoff]
+        grid = list (itertools.product (*[sweep.get (key, [value]) for key, value in zip (THRESHOLDS, current)]))
+        sweepResults = list ()
+        for point in grid:
+            results = getCandidates (stats, nameList["feature"], allClusters, *point)
+            results = pd.concat (results, axis = 0, ignore_index = True) if len (results) > 0 else pd.DataFrame (columns = ["feature", "cluster", "regulation", "method"])
+            if args.countsOnly:
+                results = results.groupby (["method", "regulation"]).size ().reset_index (name = "count")
+            sweepResults.append (results.assign (**dict (zip (THRESHOLDS, point))))
+        sweepResults = pd.concat (sweepResults, axis = 0, ignore_index = True)
+        sweepResults = sweepResults[THRESHOLDS + [col for col in sweepResults.columns if col not in THRESHOLDS]]
+        if not os.path.exists (args.output):
+            os.makedirs (args.output, exist_ok = True)
+        if args.countsOnly:
+            sweepResults.to_csv (os.path.join (args.output, "comparison_sweep_counts.tsv"), index = None, sep = "\t")
+        else:
+            sweepResults = sweepResults.sort_values (THRESHOLDS + ["cluster", "feature", "method"]).reset_index (drop = True)
+            sweepResults.to_csv (os.path.join (args.output, "comparison_sweep.tsv"), index = None, sep = "\t")
+        return
+    results = getCandidates (stats, nameList["feature"], allClusters, log2FC_cutoff, padj_cutoff, avgFV_cutoff, pctMainFS_cutoff)
 
     if not os.path.exists (args.output):
         os.makedirs (args.output, exist_ok = True)
@@ -1,34 +1,46 @@
 import os
 import json
 import argparse
+import warnings
 import numpy as np
 import pandas as pd
-from estimator import estimatorByCutoff, estimatorByParameter, estimatorByDefault
+from estimator import estimatorByCutoff, estimatorByParameter, estimatorByDefault, sketchEstimatorByCutoff, sketchEstimatorByParameter
+from concepts import ConceptBank
+from streaming import readChunks, QuantileSketch, sketchError
+from preprocess import preprocessMatrix
+from cache import Cache
 
 # python main_concepts.py --mtx rawValueMatrix --metadata metadata --config config --perCluster --output outputDirectory
 
 
-def getConcepts (mtx, numFuzzySets, fuzzyBy, mode, config):
+def getConcepts (mtx, numFuzzySets, fuzzyBy, mode, config, n_jobs = 1):
     if mode == "cutoff":
         functionType = config["function_type"]
         cutoffBy = config.get ("cutoff__method", "proportion")
         percents = config.get ("cutoff__percent_per_fuzzy_set", list ())
         slope = config.get ("cutoff__slope_per_cutoff", list ())
         concepts = estimatorByCutoff (mtx, numFuzzySets, functionType, fuzzyBy = fuzzyBy, cutoffBy = cutoffBy,
-                                      percents = percents, slope = slope, labelValues = [np.nan])
+                                      percents = percents, slope = slope, labelValues = [np.nan], n_jobs = n_jobs)
     elif mode == "parameter":
         functionType = config["function_type"]
         paramBy = config.get ("parameter__method", "percentile")
         functionParams = config["parameter__values"]
-        concepts = estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = fuzzyBy, paramBy = paramBy, labelValues = [np.nan])
+        concepts = estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = fuzzyBy, paramBy = paramBy, labelValues = [np.nan],
+                                         n_jobs = n_jobs)
     elif mode == "default":
         bwFct = config.get ("default__band_width_factor", 1)
         widthFct = config.get ("default__width_factor", 1)
         slopeFct = config.get ("default__slope_factor", 0.5)
+        kdeMethod = config.get ("default__kde_method", "auto")
+        if kdeMethod == "auto":
+            kdeMethod = "binned" if fuzzyBy == "matrix" else "exact"
+        kdeGridSize = config.get ("default__kde_grid_size", 1024)
         if fuzzyBy == "feature":
-            concepts = estimatorByDefault (mtx, numFuzzySets, widthFactor = widthFct, slopeFactor = slopeFct, bwFactor = bwFct)
+            concepts = estimatorByDefault (mtx, numFuzzySets, widthFactor = widthFct, slopeFactor = slopeFct, bwFactor = bwFct,
+                                           kdeMethod = kdeMethod, kdeGridSize = kdeGridSize, n_jobs = n_jobs)
         elif fuzzyBy == "sample":
-            concepts = estimatorByDefault (mtx.T, numFuzzySets, widthFactor = widthFct, slopeFactor = slopeFct, bwFactor = bwFct)
+            concepts = estimatorByDefault (mtx.T, numFuzzySets, widthFactor = widthFct, slopeFactor = slopeFct, bwFactor = bwFct,
+                                           kdeMethod = kdeMethod, kdeGridSize = kdeGridSize, n_jobs = n_jobs)
         elif fuzzyBy == "matrix":
             values = mtx.melt ()["value"].dropna (); mu = values.mean ()
             sigma = np.sqrt (values[values < mu].std () ** 2 + values[values > mu].std () ** 2)
@@ -39,24 +51,66 @@ def getConcepts (mtx, numFuzzySets, fuzzyBy, mode, config):
             left = min (xRange[0], concept[0][3]); right = max (xRange[1], concept[-1][1])
             concept[0][0] = left; concept[0][1] = left; concept[-1][2] = right; concept[-1][3] = right
             concept[centerIdx] = [round (mu, 3), round (sigma, 3)]
-            concepts = {sample: concept for sample in mtx.columns}
+            concepts = ConceptBank.fromFeatures ({sample: concept for sample in mtx.columns})
     else:
         raise ValueError
     return concepts
 
 
 
+def cleanMatrix (mtx, labels, cutoffLeft, cutoffRight):
+    values, _, _, _ = preprocessMatrix (mtx.to_numpy (dtype = float), labels, cutoffLeft, cutoffRight, noiseRep = [np.nan, np.nan], noiseAsLabel = False)
+    return pd.DataFrame (values, index = mtx.index, columns = mtx.columns)
+
+
+
+def streamConcepts (path, chunkSize, numFuzzySets, fuzzyBy, mode, config, labels, clusters = None, n_jobs = 1):
+    if mode == "cutoff" and config.get ("cutoff__method", "proportion") == "proportion":
+        estimate = lambda sketch: sketchEstimatorByCutoff (sketch, numFuzzySets, config["function_type"],
+                                                           percents = config.get ("cutoff__percent_per_fuzzy_set", list ()),
+                                                           slope = config.get ("cutoff__slope_per_cutoff", list ()))
+    elif mode == "parameter" and config.get ("parameter__method", "percentile") == "percentile":
+        estimate = lambda sketch: sketchEstimatorByParameter (sketch, config["function_type"], config["parameter__values"])
+    else:
+        raise ValueError
+    banks = dict (); sketches = dict (); features = list ()
+    for chunk in readChunks (path, chunkSize):
+        chunk = cleanMatrix (chunk, labels, config.get ("left_noise_cutoff", "-Infinity"), config.get ("right_noise_cutoff", "+Infinity"))
+        features += list (chunk.index)
+        for cluster, columns in ({"ALL": chunk.columns} if clusters is None else clusters).items ():
+            if fuzzyBy == "feature":
+                banks.setdefault (cluster, list ()).append (getConcepts (chunk[columns], numFuzzySets, fuzzyBy, mode, config, n_jobs = n_jobs))
+                continue
+            if cluster not in sketches:
+                sketches[cluster] = QuantileSketch (columns if fuzzyBy == "sample" else ["value"], error = config.get ("sketch__error", 0.01))
+            block = chunk[columns].to_numpy (dtype = float)
+            sketches[cluster].update (block.T if fuzzyBy == "sample" else block.reshape (1, -1))
+    if fuzzyBy == "feature":
+        banks = {cluster: ConceptBank.join (banks[cluster]) for cluster in banks.keys ()}
+    else:
+        banks = {cluster: estimate (sketches[cluster]) for cluster in sketches.keys ()}
+        if fuzzyBy == "matrix" and mode == "parameter":
+            banks = {cluster: banks[cluster].repeat (features) for cluster in banks.keys ()}
+    if clusters is None:
+        return banks["ALL"], sketches
+    return ConceptBank.concat ([banks[cluster] for cluster in clusters.keys ()], clusters = list (clusters.keys ())), sketches
+
+
+
 def main ():
     parser = argparse.ArgumentParser ()
     parser.add_argument ("--mtx", type = str, required = True, help = "Raw value matrix (TSV)")
     parser.add_argument ("--config", type = str, required = True, help = "Config file for fuzzy concept argmuents (JSON)")
     parser.add_argument ("--metadata", type = str, required = False, help = "Metadata containing clustering column (TSV)")
     parser.add_argument ("--perCluster", required = False, action = "store_true", help = "Whether to define fuzzy concept(s) per cluster")
-    parser.add_argument ("--output", type = str, required = True, help = "Output file name for fuzzy concepts")
+    parser.add_argument ("--workers", type = int, required = False, default = 1, help = "Number of worker processes for concept estimation")
+    parser.add_argument ("--chunkSize", type = int, required = False, help = "Number of rows per chunk for streaming estimation (cutoff proportion or parameter percentile mode)")
+    parser.add_argument ("--sketchReport", type = str, required = False, help = "Output file name for quantile sketch error against exact quantiles (TSV)")
+    parser.add_argument ("--cache", type = str, required = False, default = None, help = "Cache directory for fuzzy concepts of previous runs (caching is disabled if not given)")
+    parser.add_argument ("--cacheSize", type = float, required = False, default = 2048, help = "Size limit of the cache directory in MB")
+    parser.add_argument ("--output", type = str, required = True, help = "Output file name for fuzzy concepts (NPZ, or JSON for export)")
     args = parser.parse_args ()
     
-    mtx = pd.read_csv (args.mtx, index_col = 0, sep = "\t")
-    mtx = mtx.rename (columns = {col: col[:-2] if col.endswith (".1") else col for col in mtx.columns})
     if args.perCluster:
         metadata = pd.read_csv (args.metadata, index_col = None, sep = "\t")
         if metadata.columns[0] == "Unnamed: 0":
@@ -71,29 +125,59 @@ def main ():
     numFuzzySets = config["number_fuzzy_sets"]
     fuzzyBy = config.get ("define_concept_per", "feature")
     labels = [const.get (x, x) for x in config.get ("label_values", list ())]
-    mtx = mtx.replace (labels, np.nan)
-    if isinstance (const.get ("left_noise_cutoff", "-Infinity"), (int, float)):
-        mtx = mtx.mask ((~np.isnan (mtx)) & (mtx <= const["left_noise_cutoff"]))
-    if isinstance (const.get ("right_noise_cutoff", "+Infinity"), (int, float)):
-        mtx = mtx.mask ((~np.isnan (mtx)) & (mtx >= const["right_noise_cutoff"]))
-
-    mode = config.get ("define_concept_by", "default"); constRev = {-np.inf: "-Infinity", np.inf: "Infinity"}
+    mode = config.get ("define_concept_by", "default")
+    cutoffLeft = config.get ("left_noise_cutoff", "-Infinity")
+    cutoffRight = config.get ("right_noise_cutoff", "+Infinity")
     if args.perCluster and fuzzyBy != "sample":
         indexCol = config.get ("metadata_index_column", "index"); clusterCol = config.get ("metadata_cluster_column", "cluster")
-        fuzzyConcepts = dict ()
-        for cluster in sorted (set (metadata[clusterCol])):
-            tmp = getConcepts (mtx[metadata.loc[metadata[clusterCol] == cluster, indexCol]], numFuzzySets, fuzzyBy, mode, config)
-            fuzzyConcepts[cluster] = {key: [[constRev.get (x, x) if not np.isnan (x) else "NaN" for x in t] for t in tmp[key]]
-                                      for key in tmp.keys ()}
+        allClusters = sorted (set (metadata[clusterCol]))
+        clusters = {cluster: metadata.loc[metadata[clusterCol] == cluster, indexCol] for cluster in allClusters}
     else:
-        tmp = getConcepts (mtx, numFuzzySets, fuzzyBy, mode, config)
-        fuzzyConcepts = {"ALL": {key: [[constRev.get (x, x) if not np.isnan (x) else "NaN" for x in t] for t in tmp[key]]
-                                 for key in tmp.keys ()}}
-
-    if not os.path.exists (os.path.dirname (args.output)):
-        os.makedirs (os.path.dirname (args.output))
-    with open (args.output, "w", encoding = "utf-8") as f:
-        json.dump (fuzzyConcepts, f, ensure_ascii = False, indent = 4, allow_nan = True)
+        clusters = None
+
+    outputDir = os.path.dirname (os.path.abspath (args.output))
+    cache = None if args.cache is None or args.sketchReport is not None else Cache (args.cache, maxSize = args.cacheSize)
+    if cache is not None:
+        key = cache.key ([args.mtx] + ([args.metadata] if args.perCluster else list ()),
+                         {"script": "main_concepts", "config": config, "perCluster": args.perCluster, "chunkSize": args.chunkSize,
+                          "output": os.path.basename (args.output)})
+        if cache.load (key, outputDir):
+            print ("cached fuzzy concepts", key)
+            return
+
+    if args.chunkSize is not None:
+        fuzzyConcepts, sketches = streamConcepts (args.mtx, args.chunkSize, numFuzzySets, fuzzyBy, mode, config, labels,
+                                                  clusters = clusters, n_jobs = args.workers)
+        if args.sketchReport is not None:
+            mtx = cleanMatrix (pd.read_csv (args.mtx, index_col = 0, sep = "\t"), labels, cutoffLeft, cutoffRight)
+            mtx = mtx.rename (columns = {col: col[:-2] if col.endswith (".1") else col for col in mtx.columns})
+            report = list ()
+            for cluster, sketch in sketches.items ():
+                subset = mtx if clusters is None else mtx[clusters[cluster]]
+                subset = subset.T if fuzzyBy == "sample" else pd.DataFrame (subset.melt ()["value"]).T
+                report.append (sketchError (sketch, subset, np.linspace (0, 1, 101)).assign (cluster = cluster))
+            if len (report) == 0:
+                warnings.warn ("Feature-wise streaming uses exact quantiles, no sketch error to report.")
+            else:
+                report = pd.concat (report, ignore_index = True)
+                print (report.groupby ("cluster")[["absolute_error", "rank_error"]].max ())
+                report.to_csv (args.sketchReport, sep = "\t", index = False)
+    else:
+        mtx = pd.read_csv (args.mtx, index_col = 0, sep = "\t")
+        mtx = mtx.rename (columns = {col: col[:-2] if col.endswith (".1") else col for col in mtx.columns})
+        mtx = cleanMatrix (mtx, labels, cutoffLeft, cutoffRight)
+        if clusters is not None:
+            fuzzyConcepts = ConceptBank.concat ([getConcepts (mtx[clusters[cluster]], numFuzzySets, fuzzyBy, mode, config, n_jobs = args.workers)
+                                                 for cluster in allClusters],
+                                                clusters = allClusters, features = mtx.index if fuzzyBy == "feature" else None)
+        else:
+            fuzzyConcepts = getConcepts (mtx, numFuzzySets, fuzzyBy, mode, config, n_jobs = args.workers)
+
+    if not os.path.exists (outputDir):
+        os.makedirs (outputDir)
+    fuzzyConcepts.save (args.output)
+    if cache is not None:
+        cache.save (key, outputDir, [os.path.basename (args.output)])
 
 
 
@@ -1,30 +1,147 @@
 import os
 import json
+import shutil
 import argparse
+import warnings
 import numpy as np
 import pandas as pd
-from fuzzifier import fuzzify
+from fuzzifier import fuzzify_matrix, fuzzify_top2, labelCodes
+from preprocess import preprocessMatrix, finiteRange, noiseRepresentatives
+from cache import Cache
+from incremental import runInfo, saveRecord, loadRecord, changedConcepts, patchTSV, appendTSV, RECORD, RUN
+from concepts import ConceptBank
+from sparse import TopTwoMemberships
+from membership import MembershipStore, STORE, TOP2, writeStore, writeTopTwo, quantize, dequantize, quantizedSum, SCALE
 
 ### python main_fuzzifier.py --mtx rawValueMatrix --concept fuzzyConcepts --metadata metadata --config config --perCluster --output outputDirectory
 
 
+def clusterPlan (columns, fuzzyConcepts, clustering, fuzzyBy):
+    if fuzzyBy == "feature":
+        positions = [columns.get_indexer (clustering[cluster]) for cluster in fuzzyConcepts.clusters]
+    else:
+        positions = [np.where ([fuzzyConcepts.has (cluster, sample) for sample in columns])[0] for cluster in fuzzyConcepts.clusters]
+    order = np.concatenate ([np.asarray (colIdx, dtype = int) for colIdx in positions] + [np.zeros (0, dtype = int)])
+    bounds = np.cumsum ([0] + [len (colIdx) for colIdx in positions])
+    inverse = np.full (len (columns), len (order), dtype = int); inverse[order] = np.arange (len (order))
+    if (inverse == len (order)).any ():
+        raise ValueError (f"Sample(s) without cluster: {', '.join (map (str, columns[inverse == len (order)]))}")
+    return order, bounds, inverse
+
+
+
+def getFuzzyValues (mtx, fuzzyConcepts, clustering, fuzzyBy, fuzzyParams, quantized = False, codes = None, plan = None, top2 = False):
+    values = mtx.to_numpy (dtype = float); permFuzzyValues = None; blocks = list ()
+    fuzzify = fuzzify_top2 if top2 else fuzzify_matrix
+    if not fuzzyParams["addIndicator"]:
+        codes = np.zeros (values.shape, dtype = np.int8)
+    elif codes is None:
+        codes = labelCodes (values, fuzzyParams["indicateValue"])
+    order, bounds, inverse = clusterPlan (mtx.columns, fuzzyConcepts, clustering, fuzzyBy) if plan is None else plan
+    values = values[:, order]; codes = codes[:, order]
+    for idx, cluster in enumerate (fuzzyConcepts.clusters):
+        block = slice (bounds[idx], bounds[idx + 1])
+        if fuzzyBy == "feature":
+            concepts, isGauss = fuzzyConcepts.tensor (cluster, mtx.index)
+            memberships, allSets = fuzzify (values[:, block], concepts, isGauss, furtherParams = fuzzyParams, codes = codes[:, block])
+        else:
+            concepts, isGauss = fuzzyConcepts.tensor (cluster, mtx.columns[order[block]])
+            memberships, allSets = fuzzify (values[:, block].T, concepts, isGauss, furtherParams = fuzzyParams, codes = codes[:, block].T)
+            memberships = memberships.transpose () if top2 else np.einsum ("ijk -> jik", memberships)
+        if top2:
+            blocks.append (memberships); continue
+        if permFuzzyValues is None:
+            permFuzzyValues = np.zeros ((values.shape[0], len (order), memberships.shape[2]), dtype = np.uint16 if quantized else float)
+        permFuzzyValues[:, block, :] = quantize (memberships) if quantized else memberships
+    if top2:
+        return TopTwoMemberships.concat (blocks).take (inverse).round (3), allSets
+    allFuzzyValues = permFuzzyValues.take (inverse, axis = 1)
+    if not quantized:
+        np.round (allFuzzyValues, 3, out = allFuzzyValues)
+    return allFuzzyValues, allSets
+
+
+
+def maskNoise (mtx, labels, cutoffLeft, cutoffRight, noiseRep = None):
+    values, codes, labels, noiseRep = preprocessMatrix (mtx.to_numpy (dtype = float), labels, cutoffLeft, cutoffRight, noiseRep = noiseRep)
+    return pd.DataFrame (values, index = mtx.index, columns = mtx.columns), codes, labels, noiseRep
+
+
+
+def writeFuzzyValues (allFuzzyValues, allSets, index, columns, output, renameDict, append = False):
+    for idx in range (allFuzzyValues.shape[2]):
+        nameFS = allSets[idx]; nameFS = renameDict.get (nameFS, nameFS)
+        values = dequantize (allFuzzyValues[:, :, idx]) if allFuzzyValues.dtype == np.uint16 else allFuzzyValues[:, :, idx]
+        outputDF = pd.DataFrame (values, index = index, columns = columns)
+        outputDF.to_csv (os.path.join (output, f"fuzzyValues_{nameFS}.tsv"), sep = "\t", mode = "a" if append else "w", header = not append)
+
+
+
+def appendFuzzyValues (allFuzzyValues, allSets, index, columns, output, renameDict, outputFormat):
+    sets = [renameDict.get (nameFS, nameFS) for nameFS in allSets]
+    if outputFormat != "tsv":
+        store = MembershipStore (os.path.join (output, STORE))
+        if store.sets != sets or set (store.features) != set (index) or columns.isin (store.samples).any ():
+            raise ValueError
+        if allFuzzyValues.dtype != store.dtype:
+            allFuzzyValues = quantize (allFuzzyValues) if store.dtype == np.uint16 else dequantize (allFuzzyValues)
+        part = store.addPart (columns); part[:] = allFuzzyValues[index.get_indexer (store.features)]; part.flush ()
+    if outputFormat != "npy":
+        for idx, nameFS in enumerate (sets):
+            values = dequantize (allFuzzyValues[:, :, idx]) if allFuzzyValues.dtype == np.uint16 else allFuzzyValues[:, :, idx]
+            appendTSV (os.path.join (output, f"fuzzyValues_{nameFS}.tsv"), pd.DataFrame (values, index = index, columns = columns))
+
+
+
+def getBlockSize (numColumns, numSets, maxMemory):
+    bytesPerRow = 8 * numColumns * (4 * numSets + 4)
+    return max (1, int (maxMemory * 2 ** 20 // bytesPerRow))
+
+
+
 def main ():
     parser = argparse.ArgumentParser ()
     parser.add_argument ("--mtx", type = str, required = True, help = "Raw value matrix (TSV)")
-    parser.add_argument ("--concept", type = str, required = True, help = "Fuzzy concepts (JSON)")
+    parser.add_argument ("--concept", type = str, required = True, help = "Fuzzy concepts (NPZ or JSON)")
     parser.add_argument ("--metadata", type = str, required = False, help = "Metadata containing clustering column (TSV)")
     parser.add_argument ("--config", type = str, required = True, help = "Config file for fuzzification arguments (JSON)")
     parser.add_argument ("--perCluster", required = False, action = "store_true", help = "Whether to define fuzzy concept(s) per cluster")
+    parser.add_argument ("--maxMemory", type = float, required = False, help = "Memory budget in MB for streaming fuzzification in row blocks")
+    parser.add_argument ("--format", type = str, required = False, default = "tsv", choices = ["tsv", "npy", "both", "top2"],
+                         help = "Output format of fuzzy values (top2 keeps the two largest memberships per value)")
+    parser.add_argument ("--quantize", required = False, action = "store_true", help = "Whether to keep fuzzy values as uint16 thousandths")
+    parser.add_argument ("--incremental", required = False, action = "store_true", help = "Whether to only refuzzify features with changed concepts since the previous run")
+    parser.add_argument ("--append", required = False, action = "store_true", help = "Whether to append the samples of the matrix to the previous output (feature-wise concepts only)")
+    parser.add_argument ("--cache", type = str, required = False, default = None, help = "Cache directory for fuzzy values of previous runs (caching is disabled if not given)")
+    parser.add_argument ("--cacheSize", type = float, required = False, default = 2048, help = "Size limit of the cache directory in MB")
     parser.add_argument ("--output", type = str, required = True, help = "Output directory for fuzzy values")
     args = parser.parse_args ()
 
-    mtx = pd.read_csv (args.mtx, index_col = 0, sep = "\t")
+    with open (args.config) as f:
+        config = json.load (f); f.close ()
+    if args.format == "top2" and (args.maxMemory is not None or args.incremental or args.append or args.quantize):
+        raise ValueError
+    if args.append:
+        if config.get ("define_concept_per", "feature") != "feature":
+            raise ValueError
+        args.maxMemory = None; args.incremental = False
+    cache = None if args.cache is None or args.append else Cache (args.cache, maxSize = args.cacheSize)
+    if cache is not None:
+        key = cache.key ([args.mtx, args.concept] + ([args.metadata] if args.perCluster else list ()),
+                         {"script": "main_fuzzifier", "config": config, "perCluster": args.perCluster, "format": args.format,
+                          "quantize": args.quantize, "incremental": args.incremental})
+        if cache.load (key, args.output, owned = ["fuzzyValues_*.tsv", STORE, TOP2, RECORD, RUN]):
+            print ("cached fuzzy values", key)
+            return
+
+    if args.maxMemory is None:
+        mtx = pd.read_csv (args.mtx, index_col = 0, sep = "\t")
+    else:
+        mtx = pd.read_csv (args.mtx, index_col = 0, sep = "\t", nrows = 0)
     if args.perCluster:
         metadata = pd.read_csv (args.metadata, index_col = None, sep = "\t")
         if metadata.columns[0] == "Unnamed: 0":
             metadata = metadata.rename (columns = {"Unnamed: 0": "index"})
-    with open (args.config) as f:
-        config = json.load (f); f.close ()
     const = {"-Infinity": -np.inf, "-infinity": -np.inf, "-Inf": -np.inf, "-inf": -np.inf,
              "+Infinity": np.inf, "+infinity": np.inf, "+Inf": np.inf, "+inf": np.inf,
              "Infinity": np.inf, "infinity": np.inf, "Inf": np.inf, "inf": np.inf,
@@ -32,68 +149,138 @@ def main ():
     labels = [const.get (x, x) for x in config.get ("label_values", list ())]
     cutoffLeft = config.get ("left_noise_cutoff", "-Infinity")
     cutoffRight = config.get ("right_noise_cutoff", "+Infinity")
-    fuzzyParams = {"addIndicator": len (labels) != 0, "indicateValue": labels}
     fuzzyBy = config.get ("define_concept_per", "feature")
     renameDict = config.get ("rename_fuzzy_sets", dict ())
-    noiseRep = [np.floor (mtx.mask (~np.isfinite (mtx)).min (axis = None, skipna = True)) - 1,
-                np.ceil (mtx.mask (~np.isfinite (mtx)).max (axis = None, skipna = True)) + 1]
-    if isinstance (cutoffLeft, (int, float)):
-        mtx = mtx.mask ((~np.isnan (mtx.replace (labels, np.nan))) & (mtx <= cutoffLeft), noiseRep[0])
-        labels.append (noiseRep[0])
-    if isinstance (cutoffRight, (int, float)):
-        mtx = mtx.mask ((~np.isnan (mtx.replace (labels, np.nan))) & (mtx >= cutoffRight), noiseRep[1])
-        labels.append (noiseRep[1])
+    fuzzyParams = {"addIndicator": len (labels) != 0, "indicateValue": labels}
+    if args.maxMemory is None:
+        mtx, codes, fuzzyParams["indicateValue"], noiseRep = maskNoise (mtx, labels, cutoffLeft, cutoffRight)
+    elif isinstance (cutoffLeft, (int, float)) or isinstance (cutoffRight, (int, float)):
+        valueRange = [np.nan, np.nan]
+        for block in pd.read_csv (args.mtx, index_col = 0, sep = "\t", chunksize = getBlockSize (mtx.shape[1], 1, args.maxMemory)):
+            blockRange = finiteRange (block.to_numpy (dtype = float))
+            valueRange = [np.fmin (valueRange[0], blockRange[0]), np.fmax (valueRange[1], blockRange[1])]
+        noiseRep = noiseRepresentatives (valueRange)
+        _, _, fuzzyParams["indicateValue"], _ = maskNoise (mtx.astype (float), labels, cutoffLeft, cutoffRight, noiseRep)
+    else:
+        noiseRep = None
     
-    with open (args.concept) as f:
-        fuzzyConcepts = json.load (f)
+    fuzzyConcepts = ConceptBank.load (args.concept)
     if fuzzyBy == "matrix":
-        for key in fuzzyConcepts.keys ():
-            if len (fuzzyConcepts[key].keys ()) == 1:
-                fuzzyBy = "sample"; x = list (fuzzyConcepts[key].keys ())[0]
-                fuzzyConcepts[key] = {sample: fuzzyConcepts[key[x]] for sample in mtx.columns}
-            elif len (fuzzyConcepts[key].keys ()) == mtx.shape[0]:
-                if set (fuzzyConcepts[key].keys ()) == set (mtx.index):
-                    fuzzyBy = "feature"
-                else:
-                    raise ValueError
-            elif len (fuzzyConcepts[key].keys ()) == mtx.shape[1]:
-                if set (fuzzyConcepts[key].keys ()) == set (mtx.columns):
-                    fuzzyBy = "sample"
-                else:
-                    raise ValueError
-            else:
-                raise ValueError
+        if len (fuzzyConcepts.features) == 1:
+            fuzzyBy = "sample"; fuzzyConcepts = fuzzyConcepts.repeat (mtx.columns)
+        elif args.maxMemory is None and set (fuzzyConcepts.features) == set (mtx.index):
+            fuzzyBy = "feature"
+        elif set (fuzzyConcepts.features) == set (mtx.columns):
+            fuzzyBy = "sample"
+        elif args.maxMemory is not None:
+            fuzzyBy = "feature"
+        else:
+            raise ValueError
+    invalid = ~fuzzyConcepts.validate ()
+    if invalid.any ():
+        warnings.warn (f"{invalid.sum ()} fuzzy concept(s) with unsorted or missing parameters.")
     
-    allFuzzyValues = list ()
     if args.perCluster:
         indexCol = config.get ("metadata_index_column", "index"); clusterCol = config.get ("metadata_cluster_column", "cluster")
         clustering = metadata.groupby (clusterCol)[indexCol].agg (list).to_dict ()
+        clustering = {cluster: [sample for sample in samples if sample in mtx.columns] for cluster, samples in clustering.items ()}
     else:
         clustering = {"ALL": mtx.columns}
-    if fuzzyBy == "feature":
-        for feature in mtx.index:
-            memberships = pd.concat ([fuzzify (mtx.loc[feature, clustering[cluster]], fuzzyConcepts[cluster][feature], furtherParams = fuzzyParams)
-                                      for cluster in fuzzyConcepts.keys ()], axis = 0).loc[mtx.columns]
-            allFuzzyValues.append (memberships.round (3).to_numpy ())
-        allFuzzyValues = np.array (allFuzzyValues)
-    else:
-        for sample in mtx.columns:
-            memberships = pd.concat ([fuzzify (mtx[sample], fuzzyConcepts[cluster][sample], furtherParams = fuzzyParams)
-                                      for cluster in fuzzyConcepts.keys ()], axis = 0).loc[mtx.index]
-            allFuzzyValues.append (memberships.round (3).to_numpy ())
-        allFuzzyValues = np.einsum ("ijk -> jik", np.array (allFuzzyValues))
-    print (allFuzzyValues.shape)
-    print ("sum minimum", allFuzzyValues.sum (axis = 2).min (axis = None), "\t",
-           "sum maximum", allFuzzyValues.sum (axis = 2).max (axis = None))
 
     if not os.path.exists (args.output):
         os.makedirs (args.output, exist_ok = True)
-    renameDict[f"FS0_{noiseRep[0]}"] = "MIN-NOISE"; renameDict[f"FS0_{noiseRep[1]}"] = "MAX-NOISE"
-    for idx in range (allFuzzyValues.shape[2]):
-        nameFS = memberships.columns[idx]; nameFS = renameDict.get (nameFS, nameFS)
-        outputDF = pd.DataFrame (allFuzzyValues[:, :, idx], index = mtx.index, columns = mtx.columns)
-        outputDF.to_csv (os.path.join (args.output, f"fuzzyValues_{nameFS}.tsv"), sep = "\t")
-
+    if args.format in ["tsv", "top2"] and os.path.exists (os.path.join (args.output, STORE)):
+        shutil.rmtree (os.path.join (args.output, STORE))
+    if args.format != "top2" and os.path.exists (os.path.join (args.output, TOP2)):
+        os.remove (os.path.join (args.output, TOP2))
+    for name in [RECORD, RUN] if not args.incremental else list ():
+        if os.path.exists (os.path.join (args.output, name)):
+            os.remove (os.path.join (args.output, name))
+    if noiseRep is not None:
+        renameDict[f"FS0_{noiseRep[0]}"] = "MIN-NOISE"; renameDict[f"FS0_{noiseRep[1]}"] = "MAX-NOISE"
+    numSets = fuzzyConcepts.numSets + len (fuzzyParams["indicateValue"]) * fuzzyParams["addIndicator"]
+    if args.incremental:
+        info = runInfo ([args.mtx] + ([args.metadata] if args.perCluster else list ()),
+                        {"config": config, "perCluster": args.perCluster, "fuzzyBy": fuzzyBy, "format": args.format, "quantize": args.quantize})
+        oldConcepts, oldInfo = loadRecord (args.output)
+        changed = changedConcepts (oldConcepts, fuzzyConcepts) if oldInfo == info and fuzzyBy == "feature" else None
+        if changed is None:
+            warnings.warn ("No compatible previous output for incremental fuzzification, fuzzifying the whole matrix.")
+        else:
+            features = [feature for feature, flag in zip (fuzzyConcepts.features, changed.any (axis = 0)) if flag]
+            clusterIdx = np.where (changed.any (axis = 1))[0]
+            if args.maxMemory is None:
+                rowIdx = np.where (mtx.index.isin (features))[0]; block = mtx.iloc[rowIdx]; codes = codes[rowIdx]
+            else:
+                block = pd.concat ([chunk[chunk.index.isin (features)] for chunk in pd.read_csv (args.mtx, index_col = 0, sep = "\t",
+                                                                                                   chunksize = getBlockSize (mtx.shape[1], numSets, args.maxMemory))])
+                block, codes, _, _ = maskNoise (block, labels, cutoffLeft, cutoffRight, noiseRep)
+            if block.shape[0] > 0 and len (clusterIdx) > 0:
+                clusters = [fuzzyConcepts.clusters[c] for c in clusterIdx]
+                subConcepts = ConceptBank (fuzzyConcepts.params[clusterIdx], fuzzyConcepts.isGauss[clusterIdx], clusters, fuzzyConcepts.features,
+                                           defined = fuzzyConcepts.defined[clusterIdx])
+                colIdx = np.unique (np.concatenate ([mtx.columns.get_indexer (clustering[cluster]) for cluster in clusters]))
+                fuzzyValues, allSets = getFuzzyValues (block.iloc[:, colIdx], subConcepts, clustering, fuzzyBy, fuzzyParams, quantized = args.quantize,
+                                                       codes = codes[:, colIdx])
+                samples = list (mtx.columns[colIdx])
+                if args.format != "tsv":
+                    MembershipStore (os.path.join (args.output, STORE)).update (fuzzyValues, list (block.index), samples)
+                if args.format != "npy":
+                    for idx, nameFS in enumerate (allSets):
+                        values = dequantize (fuzzyValues[:, :, idx]) if args.quantize else fuzzyValues[:, :, idx]
+                        patchTSV (os.path.join (args.output, f"fuzzyValues_{renameDict.get (nameFS, nameFS)}.tsv"), values, list (block.index), samples)
+            print ("refuzzified", block.shape[0], "feature(s) in", len (clusterIdx), "cluster(s)")
+            saveRecord (args.output, fuzzyConcepts, info)
+            return
+    if args.format == "top2":
+        top2, allSets = getFuzzyValues (mtx, fuzzyConcepts, clustering, fuzzyBy, fuzzyParams, codes = codes, top2 = True)
+        sumFuzzyValues = top2.values.sum (axis = 2)
+        print (top2.shape)
+        print ("sum minimum", sumFuzzyValues.min (axis = None), "\t",
+               "sum maximum", sumFuzzyValues.max (axis = None))
+        writeTopTwo (args.output, top2, mtx.index, mtx.columns, [renameDict.get (FS, FS) for FS in allSets])
+    elif args.maxMemory is None:
+        allFuzzyValues, allSets = getFuzzyValues (mtx, fuzzyConcepts, clustering, fuzzyBy, fuzzyParams, quantized = args.quantize, codes = codes)
+        sumFuzzyValues = quantizedSum (allFuzzyValues, axis = 2) / SCALE if args.quantize else allFuzzyValues.sum (axis = 2)
+        print (allFuzzyValues.shape)
+        print ("sum minimum", sumFuzzyValues.min (axis = None), "\t",
+               "sum maximum", sumFuzzyValues.max (axis = None))
+        if args.append:
+            appendFuzzyValues (allFuzzyValues, allSets, mtx.index, mtx.columns, args.output, renameDict, args.format)
+        else:
+            if args.format != "npy":
+                writeFuzzyValues (allFuzzyValues, allSets, mtx.index, mtx.columns, args.output, renameDict)
+            if args.format != "tsv":
+                writeStore (args.output, allFuzzyValues, mtx.index, mtx.columns, [renameDict.get (FS, FS) for FS in allSets])
+    else:
+        blockSize = getBlockSize (mtx.shape[1], numSets, args.maxMemory); numRows = 0; sumRange = [np.inf, -np.inf]; allSets = list ()
+        plan = clusterPlan (mtx.columns, fuzzyConcepts, clustering, fuzzyBy)
+        for block in pd.read_csv (args.mtx, index_col = 0, sep = "\t", chunksize = blockSize):
+            block, codes, _, _ = maskNoise (block, labels, cutoffLeft, cutoffRight, noiseRep)
+            fuzzyValues, allSets = getFuzzyValues (block, fuzzyConcepts, clustering, fuzzyBy, fuzzyParams, quantized = args.quantize, codes = codes,
+                                                   plan = plan)
+            if args.format != "npy":
+                writeFuzzyValues (fuzzyValues, allSets, block.index, block.columns, args.output, renameDict, append = numRows > 0)
+            if args.format != "tsv":
+                if numRows == 0:
+                    features = pd.read_csv (args.mtx, index_col = 0, sep = "\t", usecols = [0]).index
+                    store = MembershipStore.create (os.path.join (args.output, STORE), features, [renameDict.get (FS, FS) for FS in allSets],
+                                                    dtype = fuzzyValues.dtype)
+                    storeValues = store.addPart (mtx.columns)
+                storeValues[numRows:(numRows + block.shape[0])] = fuzzyValues
+            sumFuzzyValues = quantizedSum (fuzzyValues, axis = 2) / SCALE if args.quantize else fuzzyValues.sum (axis = 2)
+            numRows += block.shape[0]; sumRange = [min (sumRange[0], sumFuzzyValues.min ()), max (sumRange[1], sumFuzzyValues.max ())]
+        if args.format != "tsv" and numRows > 0:
+            storeValues.flush ()
+        print ((numRows, mtx.shape[1], numSets))
+        print ("sum minimum", sumRange[0], "\t", "sum maximum", sumRange[1])
+    if args.incremental:
+        saveRecord (args.output, fuzzyConcepts, info)
+    if cache is not None:
+        names = [f"fuzzyValues_{renameDict.get (FS, FS)}.tsv" for FS in allSets] if args.format in ["tsv", "both"] else list ()
+        names += ([STORE] if args.format in ["npy", "both"] else list ()) + ([TOP2] if args.format == "top2" else list ())
+        names += [RECORD, RUN] if args.incremental else list ()
+        cache.save (key, args.output, names)
 
 
 if __name__ == "__main__":
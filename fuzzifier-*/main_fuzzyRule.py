@@ -1,46 +1,81 @@
 import os
+import json
+import shutil
 import argparse
 import numpy as np
 import pandas as pd
+from membership import loadFuzzyValues, iterFuzzyValues, fuzzyValuesIndex, hasStore, writeStore, MembershipStore, STORE, quantize, dequantize
+from inference import RuleMatrix
+
+# python main_fuzzyRule.py --numerator numeratorDirectory --denominator denominatorDirectory --config config --output outputDirectory
+
+
+def writeFuzzyLog2FC (fuzzyLog2FC, allSets, features, samples, output, append = False):
+    for idx in range (len (allSets)):
+        values = dequantize (fuzzyLog2FC[:, :, idx]) if fuzzyLog2FC.dtype == np.uint16 else fuzzyLog2FC[:, :, idx]
+        outputMtx = pd.DataFrame (values, index = features, columns = samples)
+        outputMtx.to_csv (os.path.join (output, f"fuzzyValues_{allSets[idx]}.tsv"), sep = "\t", mode = "a" if append else "w", header = not append)
+
+
+
+def getBlockSize (numColumns, rules, maxMemory):
+    bytesPerRow = 8 * numColumns * (2 * len (rules.inputSets) + 2 * len (rules.aggregates) + 3 * len (rules.outputSets))
+    return max (1, int (maxMemory * 2 ** 20 // bytesPerRow))
 
-# python main_fuzzyRule.py --numerator numeratorDirectory --denominator denominatorDirectory --output outputDirectory
 
 
 def main ():
     parser = argparse.ArgumentParser ()
     parser.add_argument ("--numerator", type = str, required = True, help = "Directory of fuzzy values in numerator samples")
     parser.add_argument ("--denominator", type = str, required = True, help = "Directory of fuzzy values in denominator samples")
+    parser.add_argument ("--config", type = str, required = False, help = "Config file for fuzzy rule table (JSON)")
+    parser.add_argument ("--format", type = str, required = False, default = "tsv", choices = ["tsv", "npy", "both"], help = "Output format of fuzzy fold changes")
+    parser.add_argument ("--quantize", required = False, action = "store_true", help = "Whether to keep fuzzy fold changes as uint16 thousandths")
+    parser.add_argument ("--maxMemory", type = float, required = False, help = "Memory budget in MB for blocked inference over feature blocks")
     parser.add_argument ("--output", type = str, required = True, help = "Ouput directory for fuzzy fold changes")
     args = parser.parse_args ()
 
-    numeratorFV = list (); denominatorFV = list ()
-    for FS in [f"FS{i}" for i in range (1, 6)]:
-        memberships = pd.read_csv (os.path.join (args.numerator, f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-        numeratorFV.append (memberships.to_numpy ())
-    nameList = {"feature": list (memberships.index), "sample": list (memberships.columns)}
-    for FS in [f"FS{i}" for i in range (1, 6)]:
-        memberships = pd.read_csv (os.path.join (args.denominator, f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-        denominatorFV.append (memberships.loc[nameList["feature"], nameList["sample"]].to_numpy ())
-    numeratorFV = np.einsum ("ijk -> jki", numeratorFV); denominatorFV = np.einsum ("ijk -> jki", denominatorFV)
-    
+    config = dict ()
+    if args.config is not None:
+        with open (args.config) as f:
+            config = json.load (f)
+    rules = RuleMatrix.fromConfig (config)
+    allSets = rules.outputSets
     if not os.path.exists (args.output):
         os.makedirs (args.output, exist_ok = True)
-    allSets = ["NA", "-INF", "INF", "--", "-", "o", "+", "++"]
-    numeratorFV = np.array ([(numeratorFV == 0).all (axis = 2), numeratorFV[:, :, 0] + numeratorFV[:, :, 1],
-                             numeratorFV[:, :, 2], numeratorFV[:, :, 3] + numeratorFV[:, :, 4]])
-    denominatorFV = np.array ([(denominatorFV == 0).all (axis = 2), denominatorFV[:, :, 0] + denominatorFV[:, :, 1],
-                               denominatorFV[:, :, 2], denominatorFV[:, :, 3] + denominatorFV[:, :, 4]])
-    dist = np.einsum ("kij, lij -> ijkl", numeratorFV, denominatorFV)
-    fuzzyLog2FC = np.array ([[[dist[i, j][0, 0], dist[i, j][0, 3], dist[i, j][3, 0],
-                               dist[i, j][0, 2] + dist[i, j][1, 3], dist[i, j][0, 1] + dist[i, j][1, 2] + dist[i, j][2, 3],
-                               dist[i, j][1, 1] + dist[i, j][2, 2] + dist[i, j][3, 3],
-                               dist[i, j][1, 0] + dist[i, j][2, 1] + dist[i, j][3, 2], dist[i, j][2, 0] + dist[i, j][3, 1]]
-                              for j in range (dist.shape[1])]
-                             for i in range (dist.shape[0])])
-    for idx in range (len (allSets)):
-        outputMtx = pd.DataFrame (fuzzyLog2FC[:, :, idx], index = nameList["feature"], columns = nameList["sample"]).round (3)
-        outputMtx.to_csv (os.path.join (args.output, f"fuzzyValues_{allSets[idx]}.tsv"), sep = "\t")
-
+    if args.format == "tsv" and os.path.exists (os.path.join (args.output, STORE)):
+        shutil.rmtree (os.path.join (args.output, STORE))
+    if args.maxMemory is None:
+        numeratorFV, features, samples = loadFuzzyValues (args.numerator, rules.inputSets)
+        denominatorFV, _, _ = loadFuzzyValues (args.denominator, rules.inputSets, features = features, samples = samples)
+        fuzzyLog2FC = rules.apply (numeratorFV, denominatorFV)
+        fuzzyLog2FC = quantize (fuzzyLog2FC) if args.quantize else np.round (fuzzyLog2FC, 3)
+        if args.format != "npy":
+            writeFuzzyLog2FC (fuzzyLog2FC, allSets, features, samples, args.output)
+        if args.format != "tsv":
+            writeStore (args.output, fuzzyLog2FC, features, samples, allSets)
+    else:
+        features, samples = fuzzyValuesIndex (args.numerator, rules.inputSets[0])
+        blockSize = getBlockSize (len (samples), rules, args.maxMemory); numRows = 0
+        inOrder = not hasStore (args.denominator) and list (fuzzyValuesIndex (args.denominator, rules.inputSets[0])[0]) == list (features)
+        denominatorBlocks = iterFuzzyValues (args.denominator, rules.inputSets, blockSize, samples = samples) if inOrder else None
+        if args.format != "tsv":
+            store = MembershipStore.create (os.path.join (args.output, STORE), features, allSets, dtype = np.uint16 if args.quantize else float)
+            storeValues = store.addPart (samples)
+        for numeratorFV, blockFeatures, _ in iterFuzzyValues (args.numerator, rules.inputSets, blockSize, samples = samples):
+            if denominatorBlocks is None:
+                denominatorFV, _, _ = loadFuzzyValues (args.denominator, rules.inputSets, features = blockFeatures, samples = samples)
+            else:
+                denominatorFV, _, _ = next (denominatorBlocks)
+            fuzzyLog2FC = rules.apply (numeratorFV, denominatorFV)
+            fuzzyLog2FC = quantize (fuzzyLog2FC) if args.quantize else np.round (fuzzyLog2FC, 3)
+            if args.format != "npy":
+                writeFuzzyLog2FC (fuzzyLog2FC, allSets, blockFeatures, samples, args.output, append = numRows > 0)
+            if args.format != "tsv":
+                storeValues[numRows:(numRows + len (blockFeatures))] = fuzzyLog2FC
+            numRows += len (blockFeatures)
+        if args.format != "tsv":
+            storeValues.flush ()
 
 
 if __name__ == "__main__":
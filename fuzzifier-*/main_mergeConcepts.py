@@ -1,10 +1,13 @@
 import os
 import json
 import argparse
+import warnings
 import numpy as np
 import pandas as pd
+from fuzzifier import maskLabels
+from concepts import ConceptBank, conceptPath
 
-# python main_mergeConcepts.py --data rawMatrixDirectory --concepts conceptDirectory --metadata metadata --config config
+# python main_mergeConcepts.py --data rawMatrixDirectory --concepts conceptDirectory --metadata metadata --config config --format npz
 
 
 def main ():
@@ -13,6 +16,7 @@ def main ():
     parser.add_argument ("--concepts", type = str, required = True, help = "Directory for fitted fuzzy concepts of numerator and denominator")
     parser.add_argument ("--config", type = str, required = True, help = "Config file for fuzzy concept argmuents (JSON)")
     parser.add_argument ("--metadata", type = str, required = False, help = "Metadata containing clustering column (TSV)")
+    parser.add_argument ("--format", type = str, required = False, default = "npz", choices = ["npz", "json"], help = "File format of merged fuzzy concepts")
     args = parser.parse_args ()
 
     numerator = pd.read_csv (os.path.join (args.data, "numerator_log.tsv"), index_col = 0, sep = "\t")
@@ -20,10 +24,8 @@ def main ():
     metadata = pd.read_csv ("./data/metadata.tsv", index_col = None, sep = "\t")
     if metadata.columns[0] == "Unnamed: 0":
         metadata = metadata.rename (columns = {"Unnamed: 0": "index"})
-    with open (os.path.join (args.concepts, "concepts_log_numerator.json")) as f:
-        backup = json.load (f)
-    with open (os.path.join (args.concepts, "concepts_log_denominator.json")) as f:
-        concepts = json.load (f)
+    backup = ConceptBank.load (conceptPath (args.concepts, "concepts_log_numerator"))
+    concepts = ConceptBank.load (conceptPath (args.concepts, "concepts_log_denominator"))
     with open (args.config) as f:
         config = json.load (f)
     
@@ -38,35 +40,34 @@ def main ():
     widthFct = config.get ("default__width_factor", 1)
     slopeFct = config.get ("default__slope_factor", 0.5)
 
-    allClusters = sorted (set (metadata[clusterCol]))
-    concepts_merged = dict ()
+    allClusters = sorted (set (metadata[clusterCol])); features = list (denominator.index)
+    offsets = widthFct * np.array ([i + overlap for i in np.linspace (-numFuzzySets, numFuzzySets, numFuzzySets + 1) for overlap in [-slopeFct, slopeFct]])
+    window = np.array ([range (2 * k - 2, 2 * k + 2) for k in range (1, numFuzzySets + 1)])
+    merged = list ()
     for cluster in allClusters:
-        concepts_merged[cluster] = dict ()
         sampleList = metadata.loc[metadata[clusterCol] == cluster, indexCol]
-        for feature in denominator.index:
-            values = pd.concat ([numerator.loc[feature, sampleList], denominator.loc[feature, sampleList]]).replace (labels, np.nan).dropna ()
-            if values.empty:
-                xRange = [-6, 6]
-            else:
-                xRange = [np.floor (values.min ()) - 1, np.ceil (values.max ()) + 1]
-            if feature in concepts[cluster]:
-                concept = concepts[cluster][feature].copy ()
-            else:
-                if feature in backup[cluster]:
-                    concept = backup[cluster][feature].copy ()
-                else:
-                    mu = values[np.isfinite (values)].mean (skipna = True); sigma = values[np.isfinite (values)].std (skipna = True)
-                    mu = 0 if np.isnan (mu) else mu; sigma = 1 if np.isnan (sigma) or sigma == 0 else sigma
-                    coords = [mu + widthFct * (i + overlap) * sigma for i in np.linspace (-numFuzzySets, numFuzzySets, numFuzzySets + 1)
-                              for overlap in [-slopeFct, slopeFct]]
-                    concept = np.round ([coords[(2 * k - 2):(2 * k + 2)] for k in range (1, numFuzzySets + 1)], 3).tolist ()
-                    concept[2] = [round (mu, 3), round (sigma, 3)]
-            left = min (xRange[0], concept[0][2]); right = max (xRange[1], concept[-1][1])
-            concept[0][0] = left; concept[0][1] = left; concept[-1][2] = right; concept[-1][3] = right
-            concepts_merged[cluster][feature] = concept.copy ()
+        values = np.concatenate ([numerator.loc[features, sampleList].to_numpy (dtype = float),
+                                  denominator.loc[features, sampleList].to_numpy (dtype = float)], axis = 1)
+        values[maskLabels (values, labels)] = np.nan; finite = np.where (np.isfinite (values), values, np.nan)
+        with warnings.catch_warnings (), np.errstate (invalid = "ignore"):
+            warnings.simplefilter ("ignore", category = RuntimeWarning)
+            xRange = np.stack ([np.floor (np.nanmin (values, axis = 1)) - 1, np.ceil (np.nanmax (values, axis = 1)) + 1], axis = 1)
+            mu = np.nanmean (finite, axis = 1); sigma = np.nanstd (finite, axis = 1, ddof = 1)
+        xRange[np.isnan (values).all (axis = 1)] = [-6, 6]
+        mu[np.isnan (mu)] = 0; sigma[np.isnan (sigma) | (sigma == 0)] = 1
+        params = np.round ((mu[:, None] + offsets[None, :] * sigma[:, None])[:, window], 3)
+        params[:, 2] = np.nan; params[:, 2, 0] = [round (x, 3) for x in mu]; params[:, 2, 1] = [round (x, 3) for x in sigma]
+        isGauss = np.zeros (params.shape[:2], dtype = bool); isGauss[:, 2] = True
+        for bank in [backup, concepts]:
+            bankParams, bankGauss, defined = bank.lookup (cluster, features)
+            params[defined] = bankParams[defined]; isGauss[defined] = bankGauss[defined]
+        left = np.where (params[:, 0, 2] < xRange[:, 0], params[:, 0, 2], xRange[:, 0])
+        right = np.where (params[:, -1, 1] > xRange[:, 1], params[:, -1, 1], xRange[:, 1])
+        params[:, 0, :2] = left[:, None]; params[:, -1, 2:] = right[:, None]
+        merged.append (ConceptBank.fromArrays (params, isGauss, features, cluster = cluster))
+    concepts_merged = ConceptBank.concat (merged)
     
-    with open (os.path.join (args.concepts, "concepts_log_feature-wise.json"), "w", encoding = "utf-8") as f:
-        json.dump (concepts_merged, f, ensure_ascii = False, indent = 4, allow_nan = True)
+    concepts_merged.save (os.path.join (args.concepts, f"concepts_log_feature-wise.{args.format}"))
 
 
 
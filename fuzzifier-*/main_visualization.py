@@ -4,6 +4,8 @@ import argparse
 import numpy as np
 import pandas as pd
 from visualization import plot_concept, heatmap_1dim, heatmap_2aspect
+from concepts import ConceptBank, conceptPath
+from membership import loadFuzzyValues
 
 # python main_visualization.py --data rawDataDirectory --result resultDirectory --metadata metadata --config config --output outputDirectory
 
@@ -42,14 +44,12 @@ def main ():
     plot_concept (concept, ["LOW", "low", "MEDIUM", "high", "HIGH"], [colorDict[FS] for FS in allSets], [-6, 6], "z-score",
                   os.path.join (args.output, "concept_fitted_rawExpression.png"))
 
-    with open (os.path.join (config["DESeq2 2-aspect"], "concepts_DESeq2_log2FC.json")) as f:
-        concept = json.load (f)
-    plot_concept (concept["ALL"][allClusters[0]], allSets, [colorDict[FS] for FS in allSets], [-5, 5], "DESeq2 log2 fold change",
+    concept = ConceptBank.load (conceptPath (config["DESeq2 2-aspect"], "concepts_DESeq2_log2FC"))
+    plot_concept (concept.get ("ALL", allClusters[0]), allSets, [colorDict[FS] for FS in allSets], [-5, 5], "DESeq2 log2 fold change",
                   os.path.join (args.output, "concept_DESeq2_log2FC.png"))
     allSets = ["o", "*", "**", "***", "****"]
-    with open (os.path.join (config["DESeq2 2-aspect"], "concepts_DESeq2_padj.json")) as f:
-        concept = json.load (f)
-    plot_concept (np.array (list (concept["ALL"].values ())[0]), allSets, [colorDict[FS] for FS in allSets], [0, 10], "-log10 (DESeq2 corrected p-value)",
+    concept = ConceptBank.load (conceptPath (config["DESeq2 2-aspect"], "concepts_DESeq2_padj"))
+    plot_concept (np.array (concept.get ("ALL", concept.features[0])), allSets, [colorDict[FS] for FS in allSets], [0, 10], "-log10 (DESeq2 corrected p-value)",
                   os.path.join (args.output, "concept_DESeq2_padj.png"))
 
     for method in sorted (set (candidates["method"])):
@@ -58,23 +58,16 @@ def main ():
             continue
         if method.startswith ("DESeq2"):
             avgLog2FC_FS = config["DESeq2_fold_change_fuzzy_variables"]; padj_FS = config["DESeq2_p-value_fuzzy_variables"]
-            avgLog2FC_FV = list (); padj_FV = list ()
-            for FS in avgLog2FC_FS:
-                memberships = pd.read_csv (os.path.join (dir, "log2FC", f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-                avgLog2FC_FV.append (memberships.loc[common_markers["feature"]].to_numpy ())
-            nameDict = {"feature": (common_markers["feature"] + "__" + common_markers["cluster"]).tolist (), "sample": list (memberships.columns)}
-            for FS in padj_FS:
-                memberships = pd.read_csv (os.path.join (dir, "padj", f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-                padj_FV.append (memberships.loc[common_markers["feature"], nameDict["sample"]].to_numpy ())
-            heatmap_2aspect (np.einsum ("ijk -> jki", avgLog2FC_FV), np.einsum ("ijk -> jki", padj_FV), avgLog2FC_FS, padj_FS,
+            avgLog2FC_FV, _, samples = loadFuzzyValues (os.path.join (dir, "log2FC"), avgLog2FC_FS, features = common_markers["feature"])
+            nameDict = {"feature": (common_markers["feature"] + "__" + common_markers["cluster"]).tolist (), "sample": samples}
+            padj_FV, _, _ = loadFuzzyValues (os.path.join (dir, "padj"), padj_FS, features = common_markers["feature"], samples = samples)
+            heatmap_2aspect (avgLog2FC_FV, padj_FV, avgLog2FC_FS, padj_FS,
                              nameDict, colorDict, os.path.join (args.output, "common_markers_DESeq2_2-aspect.png"))
         else:
-            allFV = list (); allSets = config["fuzzy_variables"]
-            for FS in allSets:
-                memberships = pd.read_csv (os.path.join (dir, f"fuzzyValues_{FS}.tsv"), index_col = 0, sep = "\t")
-                allFV.append (memberships.loc[common_markers["feature"]].to_numpy ())
-            nameDict = {"feature": (common_markers["feature"] + "__" + common_markers["cluster"]).tolist (), "sample": list (memberships.columns)}
-            heatmap_1dim (np.einsum ("ijk -> jki", allFV), allSets, nameDict, clustering[memberships.columns], colorDict, method,
+            allSets = config["fuzzy_variables"]
+            allFV, _, samples = loadFuzzyValues (dir, allSets, features = common_markers["feature"])
+            nameDict = {"feature": (common_markers["feature"] + "__" + common_markers["cluster"]).tolist (), "sample": samples}
+            heatmap_1dim (allFV, allSets, nameDict, clustering[samples], colorDict, method,
                           os.path.join (args.output, f"common_markers_{method.replace (" ", "_")}.png"))
 
 
@@ -0,0 +1,259 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from sparse import TopTwoMemberships
+
+STORE = "fuzzyValues"
+TOP2 = "fuzzyValuesTop2.npz"
+SCALE = 1000
+MISSING = np.iinfo (np.uint16).max
+
+
+
+def quantize (values):
+    values = np.asarray (values, dtype = float)
+    codes = np.rint (np.nan_to_num (values, nan = 0) * SCALE).astype (np.uint16)
+    codes[np.isnan (values)] = MISSING
+    return codes
+
+
+
+def dequantize (codes):
+    return np.where (codes == MISSING, np.nan, codes / SCALE)
+
+
+
+def quantizedSum (codes, axis = None):
+    return np.where ((codes == MISSING).any (axis = axis), np.nan, codes.sum (axis = axis, dtype = np.int64))
+
+
+
+def quantizedMean (codes, axis = None):
+    return np.where ((codes == MISSING).any (axis = axis), np.nan, codes.mean (axis = axis, dtype = float) / SCALE)
+
+
+
+def quantizedArgmax (codes, axis = -1):
+    return codes.argmax (axis = axis)
+
+
+
+class MembershipStore:
+    def __init__ (self, path):
+        with open (os.path.join (path, "header.json")) as f:
+            header = json.load (f)
+        self.path = path; self.dtype = np.dtype (header["dtype"]); self.scale = header.get ("scale")
+        self.features = header["features"]; self.sets = header["sets"]; self.parts = header["parts"]
+        self.index ()
+
+
+    def index (self):
+        self.samples = [sample for part in self.parts for sample in part["samples"]]
+        self.featureIndex = {feature: idx for idx, feature in enumerate (self.features)}
+        self.sampleIndex = {sample: idx for idx, sample in enumerate (self.samples)}
+        self.setIndex = {nameFS: idx for idx, nameFS in enumerate (self.sets)}
+        sizes = [len (part["samples"]) for part in self.parts]
+        self.partOf = np.repeat (np.arange (len (self.parts), dtype = int), sizes)
+        self.offset = np.arange (len (self.samples), dtype = int) - np.repeat (np.cumsum ([0] + sizes, dtype = int)[:-1], sizes)
+
+
+    @property
+    def shape (self):
+        return (len (self.features), len (self.samples), len (self.sets))
+
+
+    @classmethod
+    def create (cls, path, features, sets, dtype = "float64"):
+        if os.path.exists (path):
+            shutil.rmtree (path)
+        os.makedirs (path, exist_ok = True)
+        header = {"dtype": np.dtype (dtype).str, "features": list (features), "sets": list (sets), "parts": list ()}
+        if np.dtype (dtype) == np.uint16:
+            header["scale"] = SCALE
+        with open (os.path.join (path, "header.json"), "w", encoding = "utf-8") as f:
+            json.dump (header, f, ensure_ascii = False, default = lambda x: x.item ())
+        return cls (path)
+
+
+    def saveHeader (self):
+        header = {"dtype": self.dtype.str, "features": self.features, "sets": self.sets, "parts": self.parts}
+        if self.scale is not None:
+            header["scale"] = self.scale
+        with open (os.path.join (self.path, "header.json"), "w", encoding = "utf-8") as f:
+            json.dump (header, f, ensure_ascii = False, default = lambda x: x.item ())
+
+
+    def addPart (self, samples):
+        file = f"part_{len (self.parts):04d}.npy"
+        values = np.lib.format.open_memmap (os.path.join (self.path, file), mode = "w+", dtype = self.dtype,
+                                            shape = (len (self.features), len (samples), len (self.sets)))
+        self.parts.append ({"file": file, "samples": list (samples)}); self.saveHeader (); self.index ()
+        return values
+
+
+    def part (self, idx, mode = "r"):
+        return np.load (os.path.join (self.path, self.parts[idx]["file"]), mmap_mode = mode)
+
+
+    def positions (self, names, lookup):
+        if names is None:
+            return slice (None)
+        return np.array ([lookup[name] for name in names], dtype = int)
+
+
+    def select (self, features = None, samples = None, sets = None):
+        rowIdx = self.positions (features, self.featureIndex); setIdx = self.positions (sets, self.setIndex)
+        colIdx = np.arange (len (self.samples)) if samples is None else self.positions (samples, self.sampleIndex)
+        numRows = len (self.features) if features is None else len (rowIdx); numSets = len (self.sets) if sets is None else len (setIdx)
+        values = np.empty ((numRows, len (colIdx), numSets), dtype = self.dtype)
+        for idx in np.unique (self.partOf[colIdx]):
+            inPart = np.where (self.partOf[colIdx] == idx)[0]; offset = self.offset[colIdx[inPart]]
+            block = self.part (idx)[rowIdx]
+            if len (offset) != block.shape[1] or (offset != np.arange (block.shape[1])).any ():
+                block = block[:, offset]
+            values[:, inPart] = block[:, :, setIdx]
+        return values
+
+
+    def update (self, values, features, samples):
+        rowIdx = self.positions (features, self.featureIndex); colIdx = self.positions (samples, self.sampleIndex)
+        for idx in np.unique (self.partOf[colIdx]):
+            inPart = np.where (self.partOf[colIdx] == idx)[0]
+            part = self.part (idx, mode = "r+"); part[np.ix_ (rowIdx, self.offset[colIdx[inPart]])] = values[:, inPart]; part.flush ()
+
+
+    def feature (self, features):
+        return self.select (features = features)
+
+
+    def sample (self, samples):
+        return self.select (samples = samples)
+
+
+    def fuzzySet (self, sets):
+        return self.select (sets = sets)
+
+
+    def frame (self, nameFS):
+        values = self.select (sets = [nameFS])[:, :, 0]
+        if self.scale is not None:
+            values = dequantize (values)
+        return pd.DataFrame (values, index = self.features, columns = self.samples)
+
+
+    def toTSV (self, directory):
+        for nameFS in self.sets:
+            self.frame (nameFS).to_csv (os.path.join (directory, f"fuzzyValues_{nameFS}.tsv"), sep = "\t")
+
+
+
+def hasStore (directory):
+    return os.path.exists (os.path.join (directory, STORE, "header.json"))
+
+
+
+def hasTopTwo (directory):
+    return os.path.exists (os.path.join (directory, TOP2))
+
+
+
+def writeTopTwo (directory, top2, features, samples, sets):
+    np.savez (os.path.join (directory, TOP2), sets = top2.sets, values = top2.values, nanSets = top2.nanSets,
+              features = np.asarray (list (features)), samples = np.asarray (list (samples)), names = np.asarray (list (sets)))
+
+
+
+def readTopTwo (directory, sets = None, features = None, samples = None):
+    with np.load (os.path.join (directory, TOP2)) as data:
+        names = data["names"].tolist (); allFeatures = data["features"].tolist (); allSamples = data["samples"].tolist ()
+        top2 = TopTwoMemberships (data["sets"], data["values"], len (names), nanSets = data["nanSets"])
+    rowIdx = None if features is None else pd.Index (allFeatures).get_indexer (list (features))
+    colIdx = None if samples is None else pd.Index (allSamples).get_indexer (list (samples))
+    if (rowIdx is not None and (rowIdx < 0).any ()) or (colIdx is not None and (colIdx < 0).any ()):
+        raise KeyError
+    order = None if sets is None else [names.index (nameFS) for nameFS in sets]
+    features = allFeatures if features is None else list (features); samples = allSamples if samples is None else list (samples)
+    return top2.select (rowIdx, colIdx, order), features, samples, names if sets is None else list (sets)
+
+
+
+def isQuantized (directory):
+    return hasStore (directory) and MembershipStore (os.path.join (directory, STORE)).scale is not None
+
+
+
+def writeStore (directory, values, features, samples, sets):
+    store = MembershipStore.create (os.path.join (directory, STORE), features, sets, dtype = values.dtype)
+    part = store.addPart (samples); part[:] = values; part.flush ()
+    return store
+
+
+
+def loadFuzzyValues (directory, sets, features = None, samples = None, quantized = False):
+    if hasStore (directory):
+        store = MembershipStore (os.path.join (directory, STORE))
+        features = store.features if features is None else list (features)
+        samples = store.samples if samples is None else list (samples)
+        values = store.select (features, samples, sets)
+        if store.scale is not None and not quantized:
+            values = dequantize (values)
+        elif store.scale is None and quantized:
+            values = quantize (values)
+        return values, features, samples
+    if hasTopTwo (directory):
+        top2, features, samples, names = readTopTwo (directory, features = features, samples = samples)
+        values = top2.toDense ()[:, :, [names.index (nameFS) for nameFS in sets]]
+        return (quantize (values) if quantized else values), features, samples
+    values = list ()
+    for nameFS in sets:
+        memberships = pd.read_csv (os.path.join (directory, f"fuzzyValues_{nameFS}.tsv"), index_col = 0, sep = "\t")
+        features = list (memberships.index) if features is None else list (features)
+        samples = list (memberships.columns) if samples is None else list (samples)
+        values.append (quantize (memberships.loc[features, samples]) if quantized else memberships.loc[features, samples].to_numpy ())
+    return np.stack (values, axis = 2), features, samples
+
+
+
+def fuzzyValuesIndex (directory, nameFS):
+    if hasStore (directory):
+        store = MembershipStore (os.path.join (directory, STORE))
+        return store.features, store.samples
+    if hasTopTwo (directory):
+        with np.load (os.path.join (directory, TOP2)) as data:
+            return data["features"].tolist (), data["samples"].tolist ()
+    path = os.path.join (directory, f"fuzzyValues_{nameFS}.tsv")
+    return list (pd.read_csv (path, index_col = 0, sep = "\t", usecols = [0]).index), list (pd.read_csv (path, index_col = 0, sep = "\t", nrows = 0).columns)
+
+
+
+def iterFuzzyValues (directory, sets, blockSize, samples = None, quantized = False):
+    if hasStore (directory):
+        store = MembershipStore (os.path.join (directory, STORE))
+        for start in range (0, len (store.features), blockSize):
+            features = store.features[start:(start + blockSize)]
+            yield loadFuzzyValues (directory, sets, features = features, samples = samples, quantized = quantized)
+        return
+    if hasTopTwo (directory):
+        top2, features, columns, names = readTopTwo (directory, samples = samples); setIdx = [names.index (nameFS) for nameFS in sets]
+        for start in range (0, len (features), blockSize):
+            values = top2.select (rowIdx = np.arange (start, min (start + blockSize, len (features)))).toDense ()[:, :, setIdx]
+            yield (quantize (values) if quantized else values), features[start:(start + blockSize)], columns
+        return
+    readers = [pd.read_csv (os.path.join (directory, f"fuzzyValues_{nameFS}.tsv"), index_col = 0, sep = "\t", chunksize = blockSize) for nameFS in sets]
+    for chunks in zip (*readers):
+        features = list (chunks[0].index); columns = list (chunks[0].columns) if samples is None else list (samples)
+        values = [quantize (chunk.loc[features, columns]) if quantized else chunk.loc[features, columns].to_numpy () for chunk in chunks]
+        yield np.stack (values, axis = 2), features, columns
+
+
+
+def loadMemberships (directory, sets, features = None, samples = None):
+    if not hasStore (directory) and hasTopTwo (directory):
+        top2, topFeatures, topSamples, names = readTopTwo (directory, features = features, samples = samples)
+        if sorted (names) == sorted (sets):
+            return top2.select (order = [names.index (nameFS) for nameFS in sets]), topFeatures, topSamples
+    return loadFuzzyValues (directory, sets, features = features, samples = samples, quantized = isQuantized (directory))
+
+
@@ -0,0 +1,37 @@
+import numpy as np
+from fuzzifier import labelCodes, labelIndex
+
+
+
+def finiteRange (values):
+    finite = np.isfinite (values)
+    if not finite.any ():
+        return [np.nan, np.nan]
+    return [np.min (values, where = finite, initial = np.inf), np.max (values, where = finite, initial = -np.inf)]
+
+
+
+def noiseRepresentatives (valueRange):
+    return [np.floor (valueRange[0]) - 1, np.ceil (valueRange[1]) + 1]
+
+
+
+def preprocessMatrix (values, labels, cutoffLeft = None, cutoffRight = None, noiseRep = None, noiseAsLabel = True):
+    values = np.array (values, dtype = float); labels = list (labels)
+    codes = labelCodes (values, labels)
+    if noiseRep is None:
+        noiseRep = noiseRepresentatives (finiteRange (values))
+    cutoffs = [cutoff if isinstance (cutoff, (int, float)) else None for cutoff in [cutoffLeft, cutoffRight]]
+    for side, cutoff in enumerate (cutoffs):
+        if cutoff is None:
+            continue
+        noise = (codes == 0) & ((values <= cutoff) if side == 0 else (values >= cutoff))
+        if noiseAsLabel:
+            labels.append (noiseRep[side]); values[noise] = noiseRep[side]; codes[noise] = labelIndex (labels)[-1]
+        else:
+            codes[noise] = -1
+    if not noiseAsLabel:
+        values[codes != 0] = np.nan
+    return values, codes, labels, noiseRep
+
+
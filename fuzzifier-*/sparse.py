@@ -0,0 +1,140 @@
+import warnings
+import numpy as np
+
+
+
+def nanDtype (numSets):
+    if numSets > 64:
+        raise ValueError
+    return np.min_scalar_type ((1 << numSets) - 1)
+
+
+
+class TopTwoMemberships:
+    def __init__ (self, sets, values, numSets, nanSets = None):
+        self.sets = np.asarray (sets, dtype = np.int8); self.values = np.asarray (values, dtype = float); self.numSets = numSets
+        if self.sets.shape != self.values.shape or self.sets.ndim != 3 or self.sets.shape[2] != 2:
+            raise ValueError
+        self.nanSets = np.zeros (self.sets.shape[:2], dtype = nanDtype (numSets)) if nanSets is None else np.asarray (nanSets, dtype = nanDtype (numSets))
+        if self.nanSets.shape != self.sets.shape[:2]:
+            raise ValueError
+
+
+    @property
+    def shape (self):
+        return self.sets.shape[:2] + (self.numSets,)
+
+
+    @classmethod
+    def fromDense (cls, memberships):
+        memberships = np.asarray (memberships, dtype = float); filled = np.nan_to_num (memberships, nan = 0)
+        sets = np.argsort (-filled, axis = 2, kind = "stable")[:, :, :2]
+        values = np.take_along_axis (filled, sets, axis = 2)
+        nanSets = np.zeros (memberships.shape[:2], dtype = nanDtype (memberships.shape[2]))
+        for idx in range (memberships.shape[2]):
+            nanSets |= np.isnan (memberships[:, :, idx]).astype (nanSets.dtype) << idx
+        dropped = filled.sum (axis = 2) - values.sum (axis = 2)
+        if (dropped > 1e-3).any ():
+            warnings.warn (f"{(dropped > 1e-3).sum ()} value(s) with non-zero membership in more than two fuzzy sets.")
+        return cls (sets, values, memberships.shape[2], nanSets = nanSets).canonical ()
+
+
+    @classmethod
+    def concat (cls, blocks, axis = 1):
+        return cls (np.concatenate ([block.sets for block in blocks], axis = axis), np.concatenate ([block.values for block in blocks], axis = axis),
+                    blocks[0].numSets, nanSets = np.concatenate ([block.nanSets for block in blocks], axis = axis))
+
+
+    def canonical (self):
+        self.sets[self.values == 0] = -1; self.values[self.sets < 0] = 0
+        swap = (self.sets[:, :, 1] >= 0) & (self.values[:, :, 0] == self.values[:, :, 1]) & (self.sets[:, :, 1] < self.sets[:, :, 0])
+        self.sets[swap] = self.sets[swap][:, ::-1]
+        return self
+
+
+    def isNaN (self, idx):
+        return ((self.nanSets >> idx) & 1).astype (bool)
+
+
+    def toDense (self):
+        dense = np.zeros (self.shape, dtype = self.values.dtype)
+        for slot in [1, 0]:
+            valid = self.sets[:, :, slot, None] >= 0
+            np.put_along_axis (dense, np.where (valid, self.sets[:, :, slot, None], 0).astype (int),
+                               np.where (valid, self.values[:, :, slot, None], 0), axis = 2)
+        for idx in range (self.numSets):
+            dense[:, :, idx][self.isNaN (idx)] = np.nan
+        return dense
+
+
+    def transpose (self):
+        return TopTwoMemberships (self.sets.transpose (1, 0, 2), self.values.transpose (1, 0, 2), self.numSets, nanSets = self.nanSets.T)
+
+
+    def take (self, indices, axis = 1):
+        return TopTwoMemberships (self.sets.take (indices, axis = axis), self.values.take (indices, axis = axis), self.numSets,
+                                  nanSets = self.nanSets.take (indices, axis = axis))
+
+
+    def round (self, decimals = 3):
+        return TopTwoMemberships (self.sets.copy (), np.round (self.values, decimals), self.numSets, nanSets = self.nanSets).canonical ()
+
+
+    def select (self, rowIdx = None, colIdx = None, order = None):
+        rowIdx = slice (None) if rowIdx is None else np.asarray (rowIdx, dtype = int)
+        colIdx = slice (None) if colIdx is None else np.asarray (colIdx, dtype = int)
+        sets = self.sets[rowIdx][:, colIdx]; values = self.values[rowIdx][:, colIdx]; nanSets = self.nanSets[rowIdx][:, colIdx]
+        if order is None:
+            return TopTwoMemberships (sets.copy (), values.copy (), self.numSets, nanSets = nanSets.copy ())
+        if sorted (order) != list (range (self.numSets)):
+            raise ValueError
+        newIdx = np.empty (self.numSets, dtype = int); newIdx[list (order)] = np.arange (self.numSets)
+        newSets = np.where (sets >= 0, newIdx[np.where (sets >= 0, sets, 0)], -1)
+        newNaN = np.zeros (nanSets.shape, dtype = nanSets.dtype)
+        for idx in range (self.numSets):
+            newNaN |= ((nanSets >> idx) & 1) << int (newIdx[idx])
+        return TopTwoMemberships (newSets, values.copy (), self.numSets, nanSets = newNaN).canonical ()
+
+
+    def mainSet (self):
+        main = np.where (self.sets[:, :, 0] >= 0, self.sets[:, :, 0], 0).astype (int)
+        for idx in reversed (range (self.numSets)):
+            main[self.isNaN (idx)] = idx
+        return main
+
+
+    def clusterSums (self, clusterCodes, numClusters):
+        numFeatures, numSamples = self.sets.shape[:2]; clusterCodes = np.asarray (clusterCodes, dtype = int)
+        key = (np.arange (numFeatures)[:, None, None] * numClusters + clusterCodes[None, :, None]) * self.numSets + self.sets
+        valid = self.sets >= 0
+        sums = np.bincount (key[valid], weights = self.values[valid], minlength = numFeatures * numClusters * self.numSets)
+        return sums.reshape (numFeatures, numClusters, self.numSets)
+
+
+    def clusterMeans (self, clusterCodes, numClusters):
+        clusterCodes = np.asarray (clusterCodes, dtype = int); counts = np.bincount (clusterCodes, minlength = numClusters)
+        with np.errstate (invalid = "ignore", divide = "ignore"):
+            means = self.clusterSums (clusterCodes, numClusters) / counts[None, :, None]
+        rows, cols = np.nonzero (self.nanSets)
+        for idx in range (self.numSets):
+            hit = self.isNaN (idx)[rows, cols]
+            means[rows[hit], clusterCodes[cols[hit]], idx] = np.nan
+        return means
+
+
+    def mainFractions (self, clusterCodes, numClusters):
+        numFeatures = self.sets.shape[0]; clusterCodes = np.asarray (clusterCodes, dtype = int)
+        counts = np.bincount (clusterCodes, minlength = numClusters)
+        key = (np.arange (numFeatures)[:, None] * numClusters + clusterCodes[None, :]) * self.numSets + self.mainSet ()
+        mainCounts = np.bincount (key.ravel (), minlength = numFeatures * numClusters * self.numSets).reshape (numFeatures, numClusters, self.numSets)
+        with np.errstate (invalid = "ignore", divide = "ignore"):
+            return mainCounts / counts[None, :, None]
+
+
+    def gini (self, clusterCodes, numClusters):
+        sums = self.clusterSums (clusterCodes, numClusters)
+        with np.errstate (invalid = "ignore", divide = "ignore"):
+            prob = sums / sums.sum (axis = 1, keepdims = True)
+        return (1 - np.nansum (prob ** 2, axis = 1)) * ~np.isnan (prob).all (axis = 1)
+
+
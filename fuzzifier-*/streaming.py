@@ -0,0 +1,91 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+
+
+def readChunks (path, chunkSize):
+    for chunk in pd.read_csv (path, index_col = 0, sep = "\t", chunksize = chunkSize):
+        yield chunk.rename (columns = {col: col[:-2] if col.endswith (".1") else col for col in chunk.columns})
+
+
+
+class QuantileSketch:
+    def __init__ (self, index, error = 0.01):
+        self.index = list (index); self.error = error
+        self.capacity = int (np.ceil (2 / error))
+        self.values = np.full ((len (self.index), 0), np.nan); self.weights = np.zeros ((len (self.index), 0))
+        self.count = np.zeros (len (self.index)); self.negInf = np.zeros (len (self.index)); self.posInf = np.zeros (len (self.index))
+        self.minimum = np.full (len (self.index), np.nan); self.maximum = np.full (len (self.index), np.nan)
+
+
+    def update (self, block):
+        block = np.asarray (block, dtype = float)
+        if block.shape[0] != len (self.index):
+            raise ValueError
+        weights = np.isfinite (block).astype (float)
+        self.compress (block, weights); self.count += weights.sum (axis = 1)
+        self.negInf += (block == -np.inf).sum (axis = 1); self.posInf += (block == np.inf).sum (axis = 1)
+        self.minimum = np.fmin (self.minimum, np.min (block, axis = 1, initial = np.inf, where = weights > 0))
+        self.maximum = np.fmax (self.maximum, np.max (block, axis = 1, initial = -np.inf, where = weights > 0))
+        self.minimum[self.count == 0] = np.nan; self.maximum[self.count == 0] = np.nan
+        return self
+
+
+    def merge (self, other):
+        if other.index != self.index:
+            raise ValueError
+        self.compress (other.values, other.weights); self.count += other.count
+        self.negInf += other.negInf; self.posInf += other.posInf
+        self.minimum = np.fmin (self.minimum, other.minimum); self.maximum = np.fmax (self.maximum, other.maximum)
+        return self
+
+
+    def compress (self, values, weights):
+        values = np.concatenate ([self.values, values], axis = 1); weights = np.concatenate ([self.weights, weights], axis = 1)
+        values[weights == 0] = np.nan
+        order = np.argsort (values, axis = 1)
+        values = np.take_along_axis (values, order, axis = 1); weights = np.take_along_axis (weights, order, axis = 1)
+        cumWeight = np.cumsum (weights, axis = 1); total = np.maximum (cumWeight[:, -1:], 1)
+        bins = np.clip (np.floor ((cumWeight - weights / 2) / total * self.capacity), 0, self.capacity - 1).astype (int)
+        bins += self.capacity * np.arange (values.shape[0])[:, None]; active = weights > 0
+        size = values.shape[0] * self.capacity
+        binWeight = np.bincount (bins[active], weights = weights[active], minlength = size)
+        binSum = np.bincount (bins[active], weights = values[active] * weights[active], minlength = size)
+        with np.errstate (invalid = "ignore", divide = "ignore"):
+            self.values = np.where (binWeight > 0, binSum / binWeight, np.nan).reshape (-1, self.capacity)
+        self.weights = binWeight.reshape (-1, self.capacity)
+
+
+    def quantile (self, qs):
+        qs = np.atleast_1d (np.asarray (qs, dtype = float)); result = np.full ((len (self.index), len (qs)), np.nan)
+        total = self.count + self.negInf + self.posInf
+        for row in np.where (total > 0)[0]:
+            position = qs * (total[row] - 1) - self.negInf[row]
+            result[row] = np.where (position < 0, -np.inf, np.inf)
+            if self.count[row] > 0:
+                active = self.weights[row] > 0; weights = self.weights[row, active]
+                rank = np.concatenate ([[0], np.cumsum (weights) - weights / 2 - 0.5, [self.count[row] - 1]])
+                value = np.concatenate ([[self.minimum[row]], self.values[row, active], [self.maximum[row]]])
+                inside = (position >= 0) & (position <= self.count[row] - 1)
+                result[row, inside] = np.interp (position[inside], rank, value)
+        return result
+
+
+
+def sketchError (sketch, matrix, qs):
+    values = matrix.to_numpy (dtype = float); qs = np.atleast_1d (np.asarray (qs, dtype = float))
+    approx = sketch.quantile (qs)
+    with warnings.catch_warnings (), np.errstate (invalid = "ignore"):
+        warnings.simplefilter ("ignore", category = RuntimeWarning)
+        exact = np.nanquantile (values, qs, axis = 1).T
+        count = np.maximum ((~np.isnan (values)).sum (axis = 1), 1)[:, None]
+        lower = (values[:, None, :] < approx[:, :, None]).sum (axis = 2) / count
+        upper = (values[:, None, :] <= approx[:, :, None]).sum (axis = 2) / count
+        rankError = np.maximum (np.maximum (lower - qs[None, :], qs[None, :] - upper), 0)
+    report = pd.DataFrame ({"row": np.repeat (matrix.index, len (qs)), "quantile": np.tile (qs, len (matrix.index)),
+                            "exact": exact.ravel (), "sketch": approx.ravel (), "absolute_error": np.abs (approx - exact).ravel (),
+                            "rank_error": rankError.ravel ()})
+    return report
+
+
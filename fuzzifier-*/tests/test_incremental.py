@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+import pandas as pd
+from concepts import ConceptBank
+
+MAIN = os.path.join (os.path.dirname (os.path.dirname (os.path.abspath (__file__))), "main_fuzzifier.py")
+
+
+
+def fuzzifierRun (tmp_path, concept, output, *flags):
+    subprocess.run ([sys.executable, "-W", "ignore", MAIN, "--mtx", str (tmp_path / "mtx.tsv"), "--concept", str (concept),
+                     "--config", str (tmp_path / "config.json"), "--output", str (output), "--format", "tsv"] + list (flags),
+                    check = True, capture_output = True)
+    return {name: pd.read_csv (output / name, index_col = 0, sep = "\t") for name in sorted (os.listdir (output)) if name.endswith (".tsv")}
+
+
+
+def test_incremental_after_full_run (tmp_path):
+    features = [f"feature{idx}" for idx in range (4)]
+    values = np.random.default_rng (0).normal (0, 1.5, (4, 10))
+    pd.DataFrame (values, index = features, columns = [f"sample{idx}" for idx in range (10)]).to_csv (tmp_path / "mtx.tsv", sep = "\t")
+    with open (tmp_path / "config.json", "w") as f:
+        json.dump ({"define_concept_per": "feature"}, f)
+    concept = [[-5, -5, -1.5, -0.5], [-1.5, -0.5, 0.5, 1.5], [0.5, 1.5, 5, 5]]
+    ConceptBank.fromArrays (np.array ([concept] * 4, dtype = float), False, features).save (str (tmp_path / "A.npz"))
+    ConceptBank.fromArrays (np.array ([concept] * 4, dtype = float) + 1, False, features).save (str (tmp_path / "B.npz"))
+
+    expected = fuzzifierRun (tmp_path, tmp_path / "A.npz", tmp_path / "fresh")
+    fuzzifierRun (tmp_path, tmp_path / "A.npz", tmp_path / "out", "--incremental")
+    assert fuzzifierRun (tmp_path, tmp_path / "B.npz", tmp_path / "out").keys () == expected.keys ()
+    result = fuzzifierRun (tmp_path, tmp_path / "A.npz", tmp_path / "out", "--incremental")
+    for name, mtx in expected.items ():
+        pd.testing.assert_frame_equal (result[name], mtx)
+
+
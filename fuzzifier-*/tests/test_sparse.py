@@ -0,0 +1,75 @@
+import numpy as np
+from fuzzifier import fuzzify_matrix, fuzzify_top2
+from sparse import TopTwoMemberships
+from aggregation import clusterAggregates
+
+
+
+def trapezoids (numFeatures):
+    concept = [[-5, -5, -1.5, -0.5], [-1.5, -0.5, 0.5, 1.5], [0.5, 1.5, 5, 5]]
+    return np.array ([concept] * numFeatures, dtype = float), np.zeros ((numFeatures, 3), dtype = bool)
+
+
+
+def sampleValues (seed = 0):
+    values = np.random.default_rng (seed).normal (0, 1.5, (6, 40))
+    values[0, :4] = np.nan; values[1, 4:6] = np.inf; values[2, 6] = -np.inf
+    return values
+
+
+
+def test_fuzzify_top2_matches_dense ():
+    concepts, isGauss = trapezoids (6)
+    for furtherParams in [dict (), {"addIndicator": True, "indicateValue": [-np.inf, np.inf]}]:
+        dense, denseSets = fuzzify_matrix (sampleValues (), concepts, isGauss, furtherParams = furtherParams)
+        top2, topSets = fuzzify_top2 (sampleValues (), concepts, isGauss, furtherParams = furtherParams)
+        dense = np.round (dense, 3); top2 = top2.round (3)
+        assert topSets == denseSets
+        np.testing.assert_array_equal (top2.toDense (), dense)
+        np.testing.assert_array_equal (top2.mainSet (), dense.argmax (axis = 2))
+
+
+
+def test_dense_round_trip_keeps_nan ():
+    concepts, isGauss = trapezoids (6)
+    dense, _ = fuzzify_matrix (sampleValues (), concepts, isGauss)
+    dense = np.round (dense, 3)
+    assert np.isnan (dense).any ()
+    np.testing.assert_array_equal (TopTwoMemberships.fromDense (dense).toDense (), dense)
+
+
+
+def test_cluster_reductions_match_dense ():
+    concepts, isGauss = trapezoids (6)
+    dense, _ = fuzzify_matrix (sampleValues (), concepts, isGauss)
+    dense = np.round (dense, 3); top2 = TopTwoMemberships.fromDense (dense)
+    clusterCodes = np.random.default_rng (1).integers (0, 4, dense.shape[1])
+    means, pct = clusterAggregates (top2, clusterCodes, 5)
+    denseMeans, densePct = clusterAggregates (dense, clusterCodes, 5)
+    np.testing.assert_allclose (means, denseMeans, rtol = 0, atol = 1e-12)
+    np.testing.assert_array_equal (np.isnan (means), np.isnan (denseMeans))
+    np.testing.assert_array_equal (pct, densePct)
+
+
+
+def test_select_reorders_sets ():
+    concepts, isGauss = trapezoids (6)
+    dense, _ = fuzzify_matrix (sampleValues (), concepts, isGauss, furtherParams = {"addIndicator": True, "indicateValue": [-np.inf, np.inf]})
+    dense = np.round (dense, 3); order = [4, 0, 3, 1, 2]
+    top2 = TopTwoMemberships.fromDense (dense).select (order = order)
+    np.testing.assert_array_equal (top2.toDense (), dense[:, :, order])
+    np.testing.assert_array_equal (top2.mainSet (), dense[:, :, order].argmax (axis = 2))
+
+
+
+def test_gini_matches_dense ():
+    concepts, isGauss = trapezoids (6)
+    dense, _ = fuzzify_matrix (sampleValues (), concepts, isGauss)
+    dense = np.round (dense, 3); clusterCodes = np.random.default_rng (2).integers (0, 3, dense.shape[1])
+    sums = np.stack ([np.nansum (dense[:, clusterCodes == c], axis = 1) for c in range (3)], axis = 1)
+    with np.errstate (invalid = "ignore", divide = "ignore"):
+        prob = sums / np.nansum (dense, axis = 1)[:, None, :]
+    expected = (1 - np.nansum (prob ** 2, axis = 1)) * ~np.isnan (prob).all (axis = 1)
+    np.testing.assert_allclose (TopTwoMemberships.fromDense (dense).gini (clusterCodes, 3), expected, rtol = 0, atol = 1e-12)
+
+
@@ -6,6 +6,7 @@ import pandas as pd
 from estimator_cutoff import estimatorByCutoff
 from estimator_default import estimatorByDefault
 from estimator_parameter import estimatorByParameter
+from preprocessing import cleanMatrix
 
 ### python main_estimator.py --mtx crispMatrix --config configFile --output outputPath
 
@@ -13,7 +14,7 @@ from estimator_parameter import estimatorByParameter
 parser = argparse.ArgumentParser ()
 parser.add_argument ("--mtx", type = str, required = True, help = "TSV file of raw value matrix to be processed")
 parser.add_argument ("--config", type = str, required = True, help = "JSON config file for fuzzy concept argmuents")
-parser.add_argument ("--output", type = str, required = True, help = "Output path for fuzzy concepts")
+parser.add_argument ("--output", type = str, required = True, help = "Output path for fuzzy concepts (NPZ, or JSON for export)")
 args = parser.parse_args ()
 
 # Load crisp matrix.
@@ -30,11 +31,8 @@ const = {"-Infinity": -np.inf, "-infinity": -np.inf, "-Inf": -np.inf, "-inf": -n
 # Get parameters from config file.
 numFuzzySets = config["number_fuzzy_sets"]
 fuzzyBy = config.get ("define_concept_per", "feature")
-mtx = mtx.replace ([const.get (x, x) for x in config.get ("label_values", list ())], np.nan)
-if isinstance (config.get ("left_noise_cutoff", "-Infinity"), (int, float)):
-    mtx = mtx.mask ((~np.isnan (mtx)) & (mtx <= config["left_noise_cutoff"]))
-if isinstance (config.get ("right_noise_cutoff", "+Infinity"), (int, float)):
-    mtx = mtx.mask ((~np.isnan (mtx)) & (mtx >= config["right_noise_cutoff"]))
+mtx = cleanMatrix (mtx, [const.get (x, x) for x in config.get ("label_values", list ())],
+                   config.get ("left_noise_cutoff", "-Infinity"), config.get ("right_noise_cutoff", "+Infinity"))
 
 # Derive fuzzy concept(s).
 match config.get ("define_concept_by", "default"):
@@ -50,8 +48,10 @@ match config.get ("define_concept_by", "default"):
         slopeFct = config.get ("default__slope_factor", 0.5)
         bwFct = config.get ("default__band_width_factor", 1)
         useOptimize = config.get ("default__use_scipy_optimization", False)
+        kdeMethod = config.get ("default__kde_method", "auto")
+        kdeGridSize = config.get ("default__kde_grid_size", 1024)
         tmp = estimatorByDefault (mtx, numFuzzySets, fuzzyBy = fuzzyBy, widthFactor = widthFct, slopeFactor = slopeFct, bwFactor = bwFct,
-                                  useOptimize = useOptimize)
+                                  useOptimize = useOptimize, kdeMethod = kdeMethod, kdeGridSize = kdeGridSize)
     case "parameter":
         functionType = config["function_type"]
         paramBy = config.get ("parameter__method", "percentile")
@@ -61,15 +61,25 @@ match config.get ("define_concept_by", "default"):
     case _:
         raise ValueError
 
-# Parse fuzzy concept(s) for output.
-constRev = {-np.inf: "-Infinity", np.inf: "Infinity"}
-fuzzyConcepts = {feature: [[constRev.get (x, x) if not np.isnan (x) else "NaN" for x in t] for t in tmp[feature]]
-                 for feature in tmp.keys ()}
-
 # Save generated fuzzy concepts.
 if not os.path.isdir (os.path.dirname (args.output)):
     os.makedirs (os.path.dirname (args.output), exist_ok = True)
-with open (args.output, "w", encoding = "utf-8") as f:
-    json.dump (fuzzyConcepts, f, ensure_ascii = False, indent = 4, allow_nan = True); f.close ()
+if args.output.endswith (".json"):
+    # Parse fuzzy concept(s) for JSON export.
+    constRev = {-np.inf: "-Infinity", np.inf: "Infinity"}
+    fuzzyConcepts = {feature: [[constRev.get (x, x) if not np.isnan (x) else "NaN" for x in t] for t in tmp[feature]]
+                     for feature in tmp.keys ()}
+    with open (args.output, "w", encoding = "utf-8") as f:
+        json.dump (fuzzyConcepts, f, ensure_ascii = False, indent = 4, allow_nan = True); f.close ()
+else:
+    # Stack fuzzy concept(s) into a feature x fuzzy set x 4 array, Gaussian functions only use the first 2 parameters.
+    features = list (tmp.keys ()); numFuzzySets = len (tmp[features[0]])
+    params = np.full ((len (features), numFuzzySets, 4), np.nan); isGauss = np.zeros ((len (features), numFuzzySets), dtype = bool)
+    for i, feature in enumerate (features):
+        for j, p in enumerate (tmp[feature]):
+            params[i, j, :len (p)] = p; isGauss[i, j] = len (p) == 2
+    header = {"features": features, "set_types": ["gauss" if x else "trapezoidal" for x in isGauss.all (axis = 0)]}
+    with open (args.output, "wb") as f:
+        np.savez (f, params = params, isGauss = isGauss, header = np.array (json.dumps (header, default = lambda x: x.item ()))); f.close ()
 
 
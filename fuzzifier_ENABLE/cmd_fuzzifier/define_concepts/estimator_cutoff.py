@@ -82,41 +82,69 @@ def getFullConcept (partial, functionType, valueRange):
 
 
 ### inputs:
-# ticks: pandas dataframe of width or value percentiles
 # numFuzzySets: number of fuzzy sets
+# functionType: type of membership functions (trapezoidal or Gaussian)
 # percents: list of expectation proportion per fuzzy set (default: list ())
 # slope: list of slope values per intersection between trapezoidal membership functions (default: list ())
-def estimateTrapezoidalConcept (ticks, numFuzzySets, percents = list (), slope = list ()):
+def getTickPositions (numFuzzySets, functionType, percents = list (), slope = list ()):
     if len (percents) != numFuzzySets:
         if len (percents) > 0:
             warnings.warn ("Unequal number of proportions and fuzzy sets, returning to default (equal) mode.")
         percents = [1 / numFuzzySets] * numFuzzySets
     cutoff = estimateCutoff (pd.DataFrame ({"percents": range (1001)}).T, [i for i in percents]).loc["percents"]
-    if len (slope) != numFuzzySets - 1:
-        if len (slope) > 0:
-            warnings.warn ("Unequal number of slopes and cutoffs, returning to default (equal) mode.")
-        slope = [cutoff.diff ().iloc[1:].min () / 4] * (numFuzzySets - 1)
-    partial = np.round ([cutoff.tolist ()[1:-1], [round (1000 * i) for i in slope]]).T
-    concept = getFullConcept (partial, "trap", [0, 1000])
-    concept = {feature: np.array ([[ticks.loc[feature, int (i)] for i in params] for params in concept]) for feature in ticks.index}
-    return concept
+    match functionType:
+        case "trapezoidal":
+            if len (slope) != numFuzzySets - 1:
+                if len (slope) > 0:
+                    warnings.warn ("Unequal number of slopes and cutoffs, returning to default (equal) mode.")
+                slope = [cutoff.diff ().iloc[1:].min () / 4] * (numFuzzySets - 1)
+            partial = np.round ([cutoff.tolist ()[1:-1], [round (1000 * i) for i in slope]]).T
+            positions = getFullConcept (partial, "trap", [0, 1000]).astype (int)
+        case "gauss":
+            positions = np.array ([0] + [int (C) for C in cutoff.iloc[1:-1]] + [1000])
+        case _:
+            raise ValueError
+    if (positions < 0).any () or (positions > 1000).any ():
+        raise ValueError
+    return positions
 
 
 
 ### inputs:
-# ticks: pandas dataframe of width or value percentiles
-# numFuzzySets: number of fuzzy sets
-# percents: list of expectation proportion per fuzzy set (default: list ())
-def estimateGaussianConcept (ticks, numFuzzySets, percents = list ()):
-    if len (percents) != numFuzzySets:
-        if len (percents) > 0:
-            warnings.warn ("Unequal number of proportions and fuzzy sets, returning to default (equal) mode.")
-        percents = [1 / numFuzzySets] * numFuzzySets
-    cutoff = estimateCutoff (pd.DataFrame ({"percents": range (1001)}).T, percents).loc["percents"]
-    concept = {feature: getFullConcept (np.array (ticks.loc[feature], [int (10 * C) for C in cutoff]), "gauss",
-                                        [ticks.loc[feature, 0], ticks.loc[feature, 1000]])
-               for feature in ticks.index}
-    return concept
+# matrix: pandas dataframe of crisp values with one row per concept
+# positions: numpy array of tick positions (0 to 1000)
+# cutoffBy: whether ticks are value percentiles ("proportion") or equal width ("width") (default: "proportion")
+# valueRange: [minimum, maximum] of matrix used for rows without values (default: None)
+def getTicks (matrix, positions, cutoffBy = "proportion", valueRange = None):
+    values = matrix.to_numpy (dtype = float)
+    with warnings.catch_warnings ():
+        warnings.simplefilter ("ignore", category = RuntimeWarning)
+        match cutoffBy:
+            case "proportion":
+                ticks = np.nanquantile (values, np.linspace (0, 1, 1001)[positions], axis = 1).T.round (3)
+                ticks[:, positions == 0] = np.floor (ticks[:, positions == 0]) - 1
+            case "width":
+                minimum = np.floor (np.nanmin (values, axis = 1)) - 1; minimum[np.isnan (minimum)] = valueRange[0]
+                maximum = np.ceil (np.nanmax (values, axis = 1)) + 1; maximum[np.isnan (maximum)] = valueRange[1]
+                ticks = minimum[:, None] + positions * ((maximum - minimum) / 1000)[:, None]
+                ticks[:, positions == 1000] = maximum[:, None]; ticks = ticks.round (3)
+            case _:
+                raise ValueError
+    return ticks
+
+
+
+### inputs:
+# cutoff: numpy array of cutoff values (including range boundaries) per feature/sample
+def estimateGaussianConcept (cutoff):
+    center = cutoff[:, 1:] - np.diff (cutoff, axis = 1) / 2
+    bounds = np.column_stack ([cutoff[:, 0], center, cutoff[:, -1]]); gaps = np.diff (bounds, axis = 1)
+    fct1 = np.sqrt (2 * np.log (2)); fct2 = np.sqrt (6 * np.log (10))
+    sigma = np.minimum (gaps[:, 1:], gaps[:, :-1]) / fct1
+    if center.shape[1] > 2:
+        sigma[:, :-1] = np.minimum (sigma[:, :-1], (bounds[:, 3:] - bounds[:, 1:-2]) / fct2)
+        sigma[:, 2:] = np.minimum (sigma[:, 2:], (bounds[:, 3:-1] - bounds[:, 1:-3]) / fct2)
+    return np.round (np.stack ([center, np.round (sigma, 3)], axis = 2), 3)
 
 
 
@@ -141,25 +169,10 @@ def estimatorByCutoff (mtx, numFuzzySets, functionType, fuzzyBy = "feature", cut
         case _:
             raise ValueError
     valueRange = [np.floor (matrix.min (axis = None, skipna = True)) - 1, np.ceil (matrix.max (axis = None, skipna = True)) + 1]
-    match cutoffBy:
-        case "proportion":
-            ticks = matrix.quantile (np.linspace (0, 1, 1001), axis = 1, numeric_only = True).T
-            ticks = ticks.round (3).rename (columns = {ticks.columns[i]: i for i in range (1001)})
-            ticks[0] = np.floor (ticks[0]) - 1; ticks[1000] + np.ceil (ticks[1000]) + 1
-        case "width":
-            ticks = pd.DataFrame ({"min": np.floor (matrix.min (axis = 1, skipna = True)) - 1,
-                                   "max": np.ceil (matrix.max (axis = 1, skipna = True)) + 1})
-            ticks.loc[np.isnan (ticks["min"]), "min"] = valueRange[0]
-            ticks.loc[np.isnan (ticks["max"]), "max"] = valueRange[1]
-            ticks = ticks.apply (lambda x: np.linspace (x["min"], x["max"], 1001), axis = 1, result_type = "expand")
-            ticks = ticks.round (3).rename (columns = {ticks.columns[i]: i for i in range (1001)})
-        case _:
-            raise ValueError
-    match functionType:
-        case "trapezoidal":
-            allFC = estimateTrapezoidalConcept (ticks, numFuzzySets, percents = percents, slope = slope)
-        case "gauss":
-            allFC = estimateGaussianConcept (ticks, numFuzzySets, percents = percents)
+    positions = getTickPositions (numFuzzySets, functionType, percents = percents, slope = slope); tickIdx = np.unique (positions)
+    ticks = getTicks (matrix, tickIdx, cutoffBy = cutoffBy, valueRange = valueRange)[:, np.searchsorted (tickIdx, positions)]
+    concepts = estimateGaussianConcept (ticks) if functionType == "gauss" else ticks
+    allFC = dict (zip (matrix.index, concepts))
     return allFC
 
 
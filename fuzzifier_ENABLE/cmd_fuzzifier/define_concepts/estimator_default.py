@@ -3,6 +3,33 @@ import pandas as pd
 from scipy import stats, signal, optimize
 
 
+### inputs:
+# values: pandas series of finite values
+# bwFactor: band width factor (default: 1)
+# kdeMethod: exact Gaussian KDE evaluated at every value ("exact") or linearly binned FFT KDE evaluated on a grid ("binned") (default: "exact")
+# gridSize: number of grid points for binned KDE (default: 1024)
+def estimateDensity (values, bwFactor = 1, kdeMethod = "exact", gridSize = 1024):
+    if kdeMethod == "exact":
+        kernel = stats.gaussian_kde (values); kernel.set_bandwidth (bw_method = bwFactor * kernel.factor)
+        density = pd.DataFrame ({"value": values, "density": kernel (values)}).sort_values ("value").drop_duplicates ()
+    elif kdeMethod == "binned":
+        x = np.asarray (values, dtype = float); bandwidth = bwFactor * np.std (x, ddof = 1) * len (x) ** (-1 / 5)
+        if not np.isfinite (bandwidth) or bandwidth <= 0:
+            raise np.linalg.LinAlgError
+        grid = np.linspace (x.min () - 4 * bandwidth, x.max () + 4 * bandwidth, gridSize); delta = grid[1] - grid[0]
+        pos = (x - grid[0]) / delta; left = np.clip (np.floor (pos).astype (int), 0, gridSize - 2); frac = pos - left
+        counts = np.bincount (left, weights = 1 - frac, minlength = gridSize) + np.bincount (left + 1, weights = frac, minlength = gridSize)
+        halfWidth = min (gridSize - 1, int (np.ceil (4 * bandwidth / delta))); offsets = np.arange (-halfWidth, halfWidth + 1)
+        weights = np.exp (-0.5 * (offsets * delta / bandwidth) ** 2) / (np.sqrt (2 * np.pi) * bandwidth * len (x))
+        gridDensity = np.clip (signal.fftconvolve (counts, weights, mode = "same"), 0, None)
+        density = pd.DataFrame ({"value": grid, "density": gridDensity})
+        kernel = lambda points: np.interp (points, grid, gridDensity)
+    else:
+        raise ValueError
+    return density, kernel
+
+
+
 ### inputs:
 # mtx: pandas dataframe of crisp value matrix
 # numFuzzySets: number of fuzzy sets
@@ -11,7 +38,10 @@ from scipy import stats, signal, optimize
 # slopeFactor: percent of slope width in each trapezoidal membership function (default: 0.5)
 # bwFactor: band width factor (default: 1)
 # useOptimize: whether to use scipy optimization for Gaussian curve fitting (default: False)
-def estimatorByDefault (mtx, numFuzzySets, fuzzyBy = "feature", widthFactor = 1, slopeFactor = 0.5, bwFactor = 1, useOptimize = False):
+# kdeMethod: KDE backend for mode finding, "exact", "binned" or "auto" for binned only if fuzzyBy is "matrix" (default: "auto")
+# kdeGridSize: number of grid points for binned KDE (default: 1024)
+def estimatorByDefault (mtx, numFuzzySets, fuzzyBy = "feature", widthFactor = 1, slopeFactor = 0.5, bwFactor = 1, useOptimize = False,
+                        kdeMethod = "auto", kdeGridSize = 1024):
     if fuzzyBy == "feature":
         finite_data = mtx.mask (~np.isfinite (mtx))
     elif fuzzyBy == "sample":
@@ -20,6 +50,8 @@ def estimatorByDefault (mtx, numFuzzySets, fuzzyBy = "feature", widthFactor = 1,
         finite_data = mtx.mask (~np.isfinite (mtx)).melt ()[["value"]].T
     else:
         raise ValueError
+    if kdeMethod == "auto":
+        kdeMethod = "binned" if fuzzyBy == "matrix" else "exact"
     centerIdx = int (numFuzzySets / 2); fuzzyConcepts = dict ()
     for feature in finite_data.index:
         values = finite_data.loc[feature].dropna (); mu = values.mean ()
@@ -27,8 +59,7 @@ def estimatorByDefault (mtx, numFuzzySets, fuzzyBy = "feature", widthFactor = 1,
             mu = 0; sigma = 1
         else:
             try:
-                kernel = stats.gaussian_kde (values); kernel.set_bandwidth (bw_method = bwFactor * kernel.factor)
-                density = pd.DataFrame ({"value": values, "density": kernel (values)}).sort_values ("value").drop_duplicates ()
+                density, kernel = estimateDensity (values, bwFactor = bwFactor, kdeMethod = kdeMethod, gridSize = kdeGridSize)
                 modes = density.iloc[signal.argrelmax (density["density"].to_numpy ())[0]].drop_duplicates ()
                 modes.loc["mean"] = {"value": mu, "density": kernel ([mu])[0]}; modes = modes.sort_values ("value")
             except np.linalg.LinAlgError:
@@ -1,3 +1,4 @@
+import warnings
 import numpy as np
 import pandas as pd
 
@@ -36,16 +37,14 @@ def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature"
                 params[0, 0] = minimum; params[0, 1] = minimum; params[-1, 2] = maximum; params[-1, 3] = maximum
                 allFC[feature] = params.tolist ()
         elif paramBy == "percentile":
-            allFC = {feature: np.round ([matrix.loc[feature].dropna ().quantile (p).tolist () for p in params], 3)
-                     for feature in matrix.index}
-            for feature in matrix.index:
-                if np.isnan (allFC[feature]).all ():
-                    allFC[feature] = np.zeros (params.shape)
-                else:
-                    minimum = np.floor (matrix.loc[feature].min (skipna = True)) - 1
-                    maximum = np.ceil (matrix.loc[feature].max (skipna = True)) + 1
-                    allFC[feature][0, 0], allFC[feature][0, 1] = minimum, minimum
-                    allFC[feature][-1, -2], allFC[feature][-1, -1] = maximum, maximum
+            values = matrix.to_numpy (dtype = float)
+            with warnings.catch_warnings ():
+                warnings.simplefilter ("ignore", category = RuntimeWarning)
+                concepts = np.round (np.nanquantile (values, params.ravel ().astype (float), axis = 1).T.reshape ((-1,) + params.shape), 3)
+                minimum = np.floor (np.nanmin (values, axis = 1)) - 1; maximum = np.ceil (np.nanmax (values, axis = 1)) + 1
+            empty = np.isnan (concepts).all (axis = (1, 2))
+            concepts[:, 0, :2] = minimum[:, None]; concepts[:, -1, -2:] = maximum[:, None]; concepts[empty] = 0
+            allFC = dict (zip (matrix.index, concepts))
         else:
             raise ValueError
     elif functionType == "gauss":
@@ -54,20 +53,15 @@ def estimatorByParameter (mtx, functionType, functionParams, fuzzyBy = "feature"
         if paramBy == "fix":
             allFC = {feature: params.tolist () for feature in matrix.index}
         elif paramBy == "percentile":
-            allFC = dict (); fct = 2 * np.sqrt (2 * np.log (2))
+            fct = 2 * np.sqrt (2 * np.log (2))
             missIdx = np.where ([not isinstance (p, (int, float)) or np.isnan (p) or not np.isfinite (p) for p in params[:, 1]])[0]
-            for feature in matrix.index:
-                center = np.round (matrix.loc[feature].dropna ().quantile (params[:, 0]).tolist (), 3)
-                if np.isnan (center).all ():
-                    allFC[feature] = np.zeros (params.shape)
-                else:
-                    std = params[:, 1].copy ()
-                    for idx in missIdx:
-                        if idx == 0:
-                            std[idx] = (center[idx + 1] - center[idx]) / fct
-                        else:
-                            std[idx] = (center[idx] - center[idx - 1]) / fct
-                    allFC[feature] = np.round ([center, std.astype (float)], 3).T
+            with warnings.catch_warnings ():
+                warnings.simplefilter ("ignore", category = RuntimeWarning)
+                center = np.round (np.nanquantile (matrix.to_numpy (dtype = float), params[:, 0].astype (float), axis = 1).T, 3)
+            gaps = np.diff (center, axis = 1) / fct
+            std = np.tile (params[:, 1], (center.shape[0], 1)); std[:, missIdx] = np.column_stack ([gaps[:, :1], gaps])[:, missIdx]
+            concepts = np.round (np.stack ([center, std.astype (float)], axis = 2), 3); concepts[np.isnan (center).all (axis = 1)] = 0
+            allFC = dict (zip (matrix.index, concepts))
         else:
             raise ValueError
     else:
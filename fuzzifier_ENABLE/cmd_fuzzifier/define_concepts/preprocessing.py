@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+
+### inputs:
+# mtx: pandas dataframe of crisp value matrix
+# labels: list of values to be labelled in the downstream analysis
+# cutoffLeft: values below or equal to this cutoff are considered as noise (ignored unless numeric)
+# cutoffRight: values above or equal to this cutoff are considered as noise (ignored unless numeric)
+def cleanMatrix (mtx, labels, cutoffLeft, cutoffRight):
+    # Label values, unlabeled NaN and noise are all masked as NaN in one pass over the float buffer.
+    values = mtx.to_numpy (dtype = float, copy = True)
+    labels = np.array ([x for x in labels if x is not None], dtype = float)
+    masked = np.isin (values, labels[~np.isnan (labels)]) | np.isnan (values)
+    for side, cutoff in enumerate ([cutoffLeft, cutoffRight]):
+        if isinstance (cutoff, (int, float)):
+            masked |= (values <= cutoff) if side == 0 else (values >= cutoff)
+    values[masked] = np.nan
+    return pd.DataFrame (values, index = mtx.index, columns = mtx.columns)
+
+
@@ -3,20 +3,13 @@ import pandas as pd
 
 
 ### inputs:
-# rawValues: pandas series of crisp values
+# crispValues: numpy array of crisp values with labels already replaced by NaN
 # functionParams: function parameters as list of lists
-# furtherParams: dictionary of further parameters, including "addIndicator", "indicateValue", "namePrefix", etc.
-def fuzzify (rawValues, functionParams, furtherParams = dict ()):
-    # Get additional parameters.
-    addIndicator = furtherParams.get ("addIndicator", False); namePrefix = furtherParams.get ("namePrefix", "FS")
+# index: index of the output dataframe
+# namePrefix: prefix of fuzzy set names
+def getMemberships (crispValues, functionParams, index, namePrefix = "FS"):
     # Prepare pandas dataframe for memberships.
-    memberships = pd.DataFrame (index = rawValues.index, columns = [f"{namePrefix}{i}" for i in range (1, len (functionParams) + 1)], dtype = float)
-    if addIndicator:
-        indicateValue = furtherParams.get ("indicateValue", [np.nan])
-        crispValues = rawValues.replace (indicateValue, np.nan).to_numpy ()
-    else:
-        crispValues = rawValues.to_numpy ()
-    index = rawValues.index
+    memberships = pd.DataFrame (index = index, columns = [f"{namePrefix}{i}" for i in range (1, len (functionParams) + 1)], dtype = float)
     for idx in range (len (functionParams)):
         name = f"{namePrefix}{idx + 1}"; params = functionParams[idx]
         if len (params) == 2: # Gaussi membership function
@@ -61,21 +54,117 @@ def fuzzify (rawValues, functionParams, furtherParams = dict ()):
                     memberships[name] = pd.Series (leftSlope + middle + rightSlope, index = index)
         else:
             raise ValueError ("There should be either 4 parameters (trapezoidal functions) or 2 parameters (Gaussian functions).")
+    return memberships
+
+
+
+### inputs:
+# functionParams: function parameters as list of lists
+def isTrapezoidPartition (functionParams):
+    # Only trapezoidal concepts whose neighbouring sets share their slopes, with strictly separated slopes and no collapsed set, qualify.
+    if len (functionParams) < 2 or any ([len (params) != 4 for params in functionParams]):
+        return False
+    concept = np.array (functionParams, dtype = float); edges = concept[:-1, 2:]
+    if not (concept[1:, :2] == edges).all () or not np.isfinite (edges).all ():
+        return False
+    if not (edges[:, 0] <= edges[:, 1]).all () or not (edges[1:, 0] > edges[:-1, 1]).all ():
+        return False
+    return not ((concept[:, 0] == concept[:, 1]) & (concept[:, 1] == concept[:, 2]) & (concept[:, 2] == concept[:, 3])).any ()
+
+
+
+### inputs:
+# crispValues: numpy array of crisp values with labels already replaced by NaN
+# functionParams: function parameters of a trapezoidal partition as list of lists
+def searchTrapezoid (crispValues, functionParams):
+    concept = np.array (functionParams, dtype = float); numSets = len (functionParams)
+    lower = concept[:-1, 2]; upper = concept[:-1, 3]
+    # Locate the slope (or plateau) of every value, which yields at most two non-zero memberships of neighbouring sets.
+    segment = np.searchsorted (upper, crispValues, side = "left"); edge = np.minimum (segment, numSets - 2)
+    left = lower[edge]; right = upper[edge]; inner = segment < numSets - 1
+    memberships = np.zeros ((len (crispValues), numSets)); position = np.arange (len (crispValues)) * numSets + segment
+    memberships.ravel ()[position] = 1
+    slope = np.flatnonzero (inner & (crispValues > left))
+    with np.errstate (divide = "ignore", invalid = "ignore"):
+        memberships.ravel ()[position[slope]] = (right[slope] - crispValues[slope]) / (right[slope] - left[slope])
+        memberships.ravel ()[position[slope] + 1] = (left[slope] - crispValues[slope]) / (left[slope] - right[slope])
+    # Crisp edges (params[0] == params[1]) belong to both neighbouring sets, except the outermost sets which exclude them.
+    point = np.flatnonzero (inner & (crispValues == left) & (left == right))
+    memberships[point, segment[point]] = (segment[point] > 0).astype (float)
+    memberships[point, segment[point] + 1] = (segment[point] < numSets - 2).astype (float)
+    if concept[-1, 0] == concept[-1, 1] and concept[0, 2] == concept[-1, 0]:
+        memberships[~inner, -1] = 0
+    # Non-finite values are evaluated by the full membership functions.
+    notFinite = ~np.isfinite (crispValues)
+    if notFinite.any ():
+        memberships[notFinite] = getMemberships (crispValues[notFinite], functionParams, range (notFinite.sum ())).to_numpy ()
+    return memberships
+
+
+
+### inputs:
+# labels: list of label values
+def labelIndex (labels):
+    # Each label is coded by the position of its first occurrence, None is given a code that never occurs.
+    first = dict (); index = list ()
+    for idx, val in enumerate (labels):
+        if val is None:
+            index.append (np.iinfo (np.int8).min)
+        else:
+            index.append (first.setdefault ("NaN" if np.isnan (val) else float (val), idx + 1))
+    if len (labels) > np.iinfo (np.int8).max:
+        raise ValueError ("At most 127 label values can be indicated.")
+    return np.array (index, dtype = np.int8)
+
+
+
+### inputs:
+# values: numpy array of crisp values
+# labels: list of label values
+def labelCodes (values, labels):
+    # Classify every value once: 0 for regular values, -1 for unlabeled NaN and the label code otherwise.
+    values = np.asarray (values, dtype = float); index = labelIndex (labels)
+    codes = np.zeros (values.shape, dtype = np.int8); nanCode = -1; keys = dict ()
+    for val, code in zip (labels, index):
+        if val is not None and np.isnan (val):
+            nanCode = code
+        elif val is not None:
+            keys[float (val)] = code
+    if len (keys) > 0:
+        order = np.array (sorted (keys)); orderCodes = np.array ([keys[x] for x in order], dtype = np.int8)
+        position = np.minimum (np.searchsorted (order, values), len (order) - 1)
+        match = order[position] == values
+        codes[match] = orderCodes[position[match]]
+    codes[np.isnan (values)] = nanCode
+    return codes
+
+
+
+### inputs:
+# rawValues: pandas series of crisp values
+# functionParams: function parameters as list of lists
+# furtherParams: dictionary of further parameters, including "addIndicator", "indicateValue", "namePrefix", etc.
+def fuzzify (rawValues, functionParams, furtherParams = dict ()):
+    # Get additional parameters.
+    addIndicator = furtherParams.get ("addIndicator", False); namePrefix = furtherParams.get ("namePrefix", "FS")
+    if addIndicator:
+        indicateValue = furtherParams.get ("indicateValue", [np.nan])
+        codes = labelCodes (rawValues.to_numpy (dtype = float), indicateValue)
+        crispValues = np.where (codes != 0, np.nan, rawValues.to_numpy (dtype = float))
+    else:
+        crispValues = rawValues.to_numpy ()
+    # Trapezoidal partitions are evaluated by one sorted search per value, other concepts by all membership functions.
+    if isTrapezoidPartition (functionParams):
+        memberships = pd.DataFrame (searchTrapezoid (crispValues.astype (float), functionParams), index = rawValues.index,
+                                    columns = [f"{namePrefix}{i}" for i in range (1, len (functionParams) + 1)])
+    else:
+        memberships = getMemberships (crispValues, functionParams, rawValues.index, namePrefix = namePrefix)
     # Handle indicator value. There would be no indicator fuzzy set by default, otherwise zeros would be excluded and indicated if given no other values.
     if addIndicator:
-        memberships.loc[np.isnan (crispValues)] = 0
-        for val in indicateValue[::-1]:
-            if val is None:
-                memberships.insert (0, f"{namePrefix}0_{val}", np.array ([x is None for x in rawValues]).astype (float))
-            elif np.isnan (val):
-                memberships.insert (0, f"{namePrefix}0_{val}", np.isnan (rawValues).astype (float))
-            elif not np.isfinite (val): # -np.inf or np.inf
-                if val < 0: # -np.inf
-                    memberships.insert (0, f"{namePrefix}0_{val}", (~np.isfinite (rawValues.replace ([None, np.nan, np.inf], 0))).astype (float))
-                else: # np.inf
-                    memberships.insert (0, f"{namePrefix}0_{val}", (~np.isfinite (rawValues.replace ([None, np.nan, -np.inf], 0))).astype (float))
-            else:
-                memberships.insert (0, f"{namePrefix}0_{val}", np.array ([x == val for x in rawValues]).astype (float))
+        memberships.loc[codes != 0] = 0
+        indicators = (codes[:, None] == labelIndex (indicateValue)).astype (float)
+        memberships = pd.concat ([pd.DataFrame (indicators, index = rawValues.index, columns = [f"{namePrefix}0_{val}" for val in indicateValue]),
+                                  memberships], axis = 1)
     # Check if any feature lacks memberships due to fuzzy concept design (e.g. all cutoffs are the same).
     memberships.loc[memberships.sum (axis = 1) == 0, f"{namePrefix}{len (functionParams) - 1}"] = 1
     return memberships
@@ -10,7 +10,7 @@ from fuzzification import fuzzify
 # Read command line arguments.
 parser = argparse.ArgumentParser ()
 parser.add_argument ("--mtx", type = str, required = True, help = "TSV file of raw value matrix to be fuzzified")
-parser.add_argument ("--concept", type = str, required = True, help = "JSON file of fuzzy concepts")
+parser.add_argument ("--concept", type = str, required = True, help = "NPZ or JSON file of fuzzy concepts")
 parser.add_argument ("--config", type = str, required = False, help = "JSON config file for fuzzification parameters")
 parser.add_argument ("--output", type = str, required = True, help = "Output directory for fuzzy values.")
 args = parser.parse_args ()
@@ -47,8 +47,14 @@ if isinstance (cutoffRight, (int, float)):
     labels.append (noiseRep[1]); renameDict[f"FS0_{noiseRep[1]}"] = "MAX-NOISE"
 
 # Load fuzzy concepts.
-with open (args.concept) as f:
-    fuzzyConcepts = json.load (f); f.close ()
+if args.concept.endswith (".json"):
+    with open (args.concept) as f:
+        fuzzyConcepts = json.load (f); f.close ()
+else:
+    with np.load (args.concept, allow_pickle = False) as data:
+        header = json.loads (data["header"].item ())
+        fuzzyConcepts = {feature: [p[:2].tolist () if gauss else p.tolist () for p, gauss in zip (params, isGauss)]
+                         for feature, params, isGauss in zip (header["features"], data["params"], data["isGauss"])}
 if conceptBy != "feature" and conceptBy != "sample":
     concept = fuzzyConcepts[list (fuzzyConcepts.keys ())[0]]
     if fuzzyBy == "feature":
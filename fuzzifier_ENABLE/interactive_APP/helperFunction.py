@@ -1,3 +1,4 @@
+import warnings
 import numpy as np
 import pandas as pd
 from scipy import stats, signal, optimize
@@ -36,19 +37,16 @@ def estimateStep (minimum, maximum):
 
 
 def getSegments (mtx, labels, valueRange):
-    tmp = mtx.replace (labels + [-np.inf, np.inf], np.nan)
-    widthTicks = pd.DataFrame ({"min": np.floor (tmp.min (axis = 1, skipna = True)) - 1,
-                                 "max": np.ceil (tmp.max (axis = 1, skipna = True)) + 1})
-    widthTicks.loc["ALL"] = {"min": valueRange[0], "max": valueRange[1]}
-    widthTicks.loc[np.isnan (widthTicks["min"]), "min"] = valueRange[0]
-    widthTicks.loc[np.isnan (widthTicks["max"]), "max"] = valueRange[1]
-    widthTicks = widthTicks.apply (lambda x: np.linspace (x["min"], x["max"], 1001),
-                                   axis = 1, result_type = "expand").round (3)
-    widthTicks = widthTicks.rename (columns = {widthTicks.columns[i]: i for i in range (1001)})
-    propTicks = tmp.quantile (np.linspace (0, 1, 1001), axis = 1, numeric_only = True).T
-    propTicks.loc["ALL"] = tmp.melt ()["value"].dropna ().quantile (np.linspace (0, 1, 1001))
-    propTicks = propTicks.rename (columns = {propTicks.columns[i]: i for i in range (1001)})
-    propTicks = round (propTicks, 3)
+    tmp = mtx.replace (labels + [-np.inf, np.inf], np.nan); values = tmp.to_numpy (dtype = float)
+    index = list (tmp.index) + ["ALL"]
+    with warnings.catch_warnings ():
+        warnings.simplefilter ("ignore", category = RuntimeWarning)
+        minimum = np.append (np.floor (np.nanmin (values, axis = 1)) - 1, valueRange[0]); minimum[np.isnan (minimum)] = valueRange[0]
+        maximum = np.append (np.ceil (np.nanmax (values, axis = 1)) + 1, valueRange[1]); maximum[np.isnan (maximum)] = valueRange[1]
+        propTicks = np.vstack ([np.nanquantile (values, np.linspace (0, 1, 1001), axis = 1).T,
+                                np.nanquantile (values.ravel (), np.linspace (0, 1, 1001))])
+    widthTicks = pd.DataFrame (np.linspace (minimum, maximum, 1001, axis = 1).round (3), index = index)
+    propTicks = pd.DataFrame (propTicks.round (3), index = index)
     return widthTicks, propTicks
 
 